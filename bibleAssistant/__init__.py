@@ -1 +1,15 @@
-from . import agent, bible_tools, evaluation
\ No newline at end of file
+"""
+Submodules are imported lazily (on first attribute access, or with an explicit "import bibleAssistant.<module>"),
+so that a light task (e.g., a verse lookup from the command line) doesn't pay for importing ollama, pandas, etc.
+"""
+import importlib
+
+_submodules = ["agent", "bible_tools", "corpus_search", "evaluation", "eval_metrics", "letter_codes", "name_resolver", "router", "service", "version_diff"]
+
+def __getattr__(name):
+    if name in _submodules:
+        return importlib.import_module(f".{name}", __name__)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def __dir__():
+    return sorted(list(globals().keys()) + _submodules)
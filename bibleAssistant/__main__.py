@@ -0,0 +1,163 @@
+"""
+Command line entry point for the bible assistant (run from the repo's main folder).
+
+Examples:
+    python -m bibleAssistant lookup genesis 1 1 --version he.text_only
+    python -m bibleAssistant search "ערום"
+    python -m bibleAssistant search "ער*ם" --mode wildcard --prefixes --version he.text_only
+    python -m bibleAssistant els "תורה" --max-skip 100
+    python -m bibleAssistant chat --model gemma3:1b-2t1-426
+    python -m bibleAssistant startup
+
+Heavy libraries are only imported by the subcommand that needs them (e.g., ollama only for chat),
+and "startup" measures the cold-start import time of the light path against a budget.
+"""
+import sys
+import json
+import argparse
+
+# Cold-start budget (milliseconds) for importing what the "lookup" subcommand needs, in a fresh interpreter:
+COLD_START_BUDGET_MS = 300
+COLD_START_MODULE = "bibleAssistant.bible_tools"
+# Modules that must NOT be imported on the light path:
+HEAVY_MODULES = ["ollama", "pandas", "numpy", "requests", "bs4", "IPython", "ipynbname"]
+
+def cmd_lookup(args) -> int:
+    from . import bible_tools as bblt
+    result = bblt.lookup_verse(args.version, args.book, args.chapter_num, args.verse_num)
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False))
+    else:
+        print(result["text"])
+    return 0
+
+def cmd_search(args) -> int:
+    from . import bible_tools as bblt
+    if args.mode:
+        # Local pattern search, printing each hit as soon as it is found:
+        from . import corpus_search
+        versions = None if args.version == "all" else [bblt.resolve_version(args.version)]
+        hits = corpus_search.iter_search_corpus(args.phrase, mode=args.mode, versions=versions, hebrew_prefixes=args.prefixes, n_max_results=args.n_max_results)
+        for res in hits:
+            if args.json:
+                print(json.dumps(res, ensure_ascii=False), flush=True)
+            else:
+                print(f"{res['book']} {res['chapter_num']}:{res['verse_num']} ({res['version']})\t{res['text']}", flush=True)
+        return 0
+    results = bblt.search_phrase(args.phrase, n_max_results=args.n_max_results)
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False))
+    else:
+        for res in results["results"]:
+            print(f"{res['book_name']} {res['chapter_num']}:{res['verse_num']}\t{res['text']}")
+    return 0
+
+def cmd_els(args) -> int:
+    from . import bible_tools as bblt
+    from . import letter_codes
+    corpus = letter_codes.load_letter_corpus(bblt.resolve_version(args.version), books=[bblt.resolve_book(book) for book in args.books] if args.books else None)
+    hits = corpus.els_search(args.word, min_skip=args.min_skip, max_skip=args.max_skip, backward=not args.forward_only, n_max_results=args.n_max_results)
+    for hit in hits:
+        if args.json:
+            print(json.dumps(hit, ensure_ascii=False))
+        else:
+            print(f"skip {hit['skip']}\t{hit['book']} {hit['chapter_num']}:{hit['verse_num']}")
+    return 0
+
+def cmd_chat(args) -> int:
+    from . import agent
+    ui = agent.AgentUI(args.model, verbose=args.verbose, html=False, warmup=True, keep_alive=args.keep_alive, use_router=args.router)
+    ui.start_session()
+    return 0
+
+def measure_import_time(module_name:str) -> dict:
+    """
+    Import a module in a fresh interpreter (with python -X importtime) and profile it.
+
+    Returns:
+    - dictionary with fields:
+        - total_ms (float): cumulative import time of the module.
+        - top_modules (list of (module, cumulative ms) tuples): the slowest imports, slowest first.
+        - heavy_modules (list of str): modules from HEAVY_MODULES that got imported.
+    """
+    import subprocess
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module_name}"], capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"Failed importing {module_name}:\n{proc.stderr}")
+    module2ms = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        (_, cumulative_us, name) = [part.strip() for part in line[len("import time:"):].split("|")]
+        module2ms[name] = int(cumulative_us) / 1000.
+    top_modules = sorted(module2ms.items(), key=lambda item: -item[1])
+    heavy = [name for name in HEAVY_MODULES if name in module2ms]
+    return {"total_ms": module2ms.get(module_name, 0.), "top_modules": top_modules[:10], "heavy_modules": heavy}
+
+def cmd_startup(args) -> int:
+    profile = measure_import_time(args.module)
+    print(f"Cold-start import of {args.module}: {profile['total_ms']:.1f} ms (budget {args.budget_ms} ms)")
+    for (name, ms) in profile["top_modules"]:
+        print(f"  {ms:8.1f} ms  {name}")
+    ok = True
+    if profile["heavy_modules"]:
+        print(f"!!! Heavy modules imported on the light path: {', '.join(profile['heavy_modules'])}")
+        ok = False
+    if profile["total_ms"] > args.budget_ms:
+        print(f"!!! Over the cold-start budget")
+        ok = False
+    return 0 if ok else 1
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m bibleAssistant", description="Bible assistant: verse lookup, search and chat with the agent.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    p = subparsers.add_parser("lookup", help="print the text of a specific verse")
+    p.add_argument("book", help="book name (e.g., genesis, Gen, בראשית)")
+    p.add_argument("chapter_num", type=int)
+    p.add_argument("verse_num", type=int)
+    p.add_argument("--version", default="he.text_only", help="version code or name (e.g., he.text_only, JPS)")
+    p.add_argument("--json", action="store_true", help="print the full result as JSON")
+    p.set_defaults(func=cmd_lookup)
+
+    p = subparsers.add_parser("search", help="find verses that contain a Hebrew word or phrase (online), or that match a pattern (local corpus)")
+    p.add_argument("phrase", help="phrase, or pattern when using --mode")
+    p.add_argument("--mode", choices=["wildcard", "regex"], default=None, help="search the local corpus with a wildcard pattern or a regular expression")
+    p.add_argument("--version", default="all", help="(with --mode) version to search in, or 'all'")
+    p.add_argument("--prefixes", action="store_true", help="(with --mode wildcard) allow Hebrew prefix letters before every word")
+    p.add_argument("--n-max-results", type=int, default=10)
+    p.add_argument("--json", action="store_true", help="print the results as JSON")
+    p.set_defaults(func=cmd_search)
+
+    p = subparsers.add_parser("els", help="find equidistant letter sequences (skip patterns) of a Hebrew word")
+    p.add_argument("word")
+    p.add_argument("--version", default="he.text_only", help="Hebrew version code or name")
+    p.add_argument("--books", nargs="*", default=None, help="books to search in (default: the Torah)")
+    p.add_argument("--min-skip", type=int, default=1)
+    p.add_argument("--max-skip", type=int, default=100)
+    p.add_argument("--forward-only", action="store_true", help="don't search for the word written backward")
+    p.add_argument("--n-max-results", type=int, default=None)
+    p.add_argument("--json", action="store_true", help="print the results as JSON")
+    p.set_defaults(func=cmd_els)
+
+    p = subparsers.add_parser("chat", help="talk with the agent in the terminal")
+    p.add_argument("--model", required=True, help="ollama model name")
+    p.add_argument("--keep-alive", default=None, help="how long ollama keeps the model loaded (e.g., 30m)")
+    p.add_argument("--router", action="store_true", help="handle explicit requests (e.g., 'Genesis 1:1 in JPS 1917') without the LLM")
+    p.add_argument("--verbose", action="store_true")
+    p.set_defaults(func=cmd_chat)
+
+    p = subparsers.add_parser("startup", help="profile the cold-start import time against the budget")
+    p.add_argument("--module", default=COLD_START_MODULE)
+    p.add_argument("--budget-ms", type=float, default=COLD_START_BUDGET_MS)
+    p.set_defaults(func=cmd_startup)
+
+    args = parser.parse_args(argv)
+    try:
+        return args.func(args)
+    except ValueError as ex:
+        print(f"Error: {ex}", file=sys.stderr)
+        return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,9 +1,16 @@
 import json
+import time
 import uuid
+import asyncio
 import inspect
-import ollama
+import concurrent.futures
 from . import bible_tools as bblt
-from IPython.display import HTML, display
+from . import router
+# ollama and IPython are imported lazily, only when talking to the LLM or displaying HTML (keep the import of this module fast).
+
+def _ollama():
+    import ollama
+    return ollama
 
 class Agent:
 
@@ -29,6 +36,8 @@ class Agent:
     TOOL_RESPOND_TO_USER = "respond_to_user"
     TOOL_LOOKUP_VERSE = "lookup_verse"
     TOOL_SEARCH_PHRASE = "search_phrase"
+    TOOL_SEARCH_PATTERN = "search_pattern"
+    TOOL_COMPARE_VERSIONS = "compare_versions"
 
     def _respond_to_user(self, text:str) -> str:
         return text
@@ -158,18 +167,116 @@ Available tools:
     def initialize_conversation(self):
         self.messages = [{"role": self.ROLE_SYSTEM, "content": self.system_instructions}]
         
-    def __init__(self, model_name:str, verbose:bool=False):
+    def __init__(self, model_name:str, verbose:bool=False, warmup:bool=False, keep_alive:str|float=None, chat_func=None, use_router:bool=False):
+        """
+        model_name: the name of a model that is locally served by ollama.
+        warmup: if True, load the model (and pre-fill the prompt cache with the system prompt) already at construction time,
+            so the first call to ask() doesn't pay for loading the model.
+        keep_alive: how long ollama should keep the model loaded after each call (e.g., "30m", or -1 for forever). None means ollama's default (5 minutes).
+        chat_func: a replacement for ollama.chat (same signature), e.g., a fake LLM backend for load testing. None means using ollama.chat.
+        use_router: if True, explicit requests (e.g., "Genesis 1:1 in JPS 1917") are handled by a deterministic router, without calling the LLM (see router.py).
+        """
         self.verbose = verbose
         self.model_name = model_name
+        self.keep_alive = keep_alive
+        self.chat_func = chat_func
+        self.warmup_latency = None
+        self.router = router.Router(self.TOOL_LOOKUP_VERSE, self.TOOL_SEARCH_PHRASE) if use_router else None
         self.tools = {
             self.TOOL_RESPOND_TO_USER: self._respond_to_user,
             self.TOOL_LOOKUP_VERSE: bblt.lookup_verse,
-            self.TOOL_SEARCH_PHRASE: bblt.search_phrase
+            self.TOOL_SEARCH_PHRASE: bblt.search_phrase,
+            self.TOOL_SEARCH_PATTERN: bblt.search_pattern,
+            self.TOOL_COMPARE_VERSIONS: bblt.compare_versions
         }
         self.system_instructions = self._generate_system_instructions()
         self.llm_response_schema = {"oneOf": [self._schema_for_tool(tool_name, func) for (tool_name, func) in self.tools.items()]}
         self.initialize_conversation()
+        if warmup:
+            self.warmup()
     
+    def warmup(self, input_messages=None) -> float:
+        """
+        Load the model into memory and let ollama evaluate the conversation prefix (by default, only the fixed system prompt),
+        generating only a single token. Ollama reuses the cached prefix in the next call, so the first real response is almost as fast as later ones.
+
+        Returns:
+        - latency (float): seconds it took to warm up.
+        """
+        if not input_messages:
+            input_messages = self.messages[:1]
+        start = time.perf_counter()
+        chat_func = self.chat_func or _ollama().chat
+        chat_func(
+            model=self.model_name,
+            messages=input_messages,
+            think=False,
+            format=self.llm_response_schema,
+            options={"num_predict": 1},
+            keep_alive=self.keep_alive
+        )
+        self.warmup_latency = time.perf_counter() - start
+        if self.verbose:
+            print(f"Warmed up model {self.model_name} in {self.warmup_latency:.2f} seconds")
+        return self.warmup_latency
+
+    def health_check(self) -> dict:
+        """
+        Check that the model is available in ollama, and report how long it takes to reach it.
+
+        Returns:
+        - dictionary with fields:
+            - model_name (str): the agent's model.
+            - ok (bool): True iff ollama responded.
+            - loaded_before (bool): True iff the model was already loaded in memory before this check.
+            - load_latency (float): seconds ollama spent on loading the model during this check (close to 0 if it was already loaded).
+            - total_latency (float): seconds for the whole round trip to ollama.
+            - warmup_latency (float): seconds of the last warmup (None if the agent was never warmed up).
+            - error_message (str): only if ok is False.
+        """
+        health = {"model_name": self.model_name, "warmup_latency": self.warmup_latency}
+        start = time.perf_counter()
+        try:
+            ollama = _ollama()
+            loaded_models = [item.model for item in ollama.ps().models]
+            health["loaded_before"] = (self.model_name in loaded_models)
+            # An empty prompt only loads the model (if needed) without generating anything:
+            response = ollama.generate(model=self.model_name, prompt="", keep_alive=self.keep_alive)
+            health["load_latency"] = (response.get("load_duration") or 0) / 1e9
+            health["ok"] = True
+        except Exception as ex:
+            health["ok"] = False
+            health["error_message"] = str(ex)
+        health["total_latency"] = time.perf_counter() - start
+        return health
+
+    def save_conversation(self, outfile:str):
+        """
+        Save the conversation state (the sequence of messages so far) to a JSONL file, one compact JSON message per line.
+        """
+        with open(outfile, 'w', encoding='utf-8') as f:
+            for message in self.messages:
+                f.write(json.dumps(message, ensure_ascii=False, separators=(',', ':')) + '\n')
+        if self.verbose:
+            print(f"==> Saved {len(self.messages)} messages to {outfile}")
+
+    def restore_conversation(self, infile:str, warmup:bool=False):
+        """
+        Restore a conversation that was saved with save_conversation(), so the next call to ask() continues it.
+        If warmup is True, also let ollama pre-fill its prompt cache with the restored conversation.
+        """
+        with open(infile, 'r', encoding='utf-8') as f:
+            messages = [json.loads(line) for line in f if line.strip()]
+        if (not messages) or (messages[0]["role"] != self.ROLE_SYSTEM):
+            raise ValueError(f"File {infile} doesn't hold a saved conversation (expecting the first message to have role '{self.ROLE_SYSTEM}').")
+        if messages[0]["content"] != self.system_instructions:
+            print(f"!!! The system prompt in {infile} differs from this agent's system prompt. Continuing with the saved one.")
+        self.messages = messages
+        if self.verbose:
+            print(f"<== Restored {len(self.messages)} messages from {infile}")
+        if warmup:
+            self.warmup(self.messages)
+
     def _call_llm(self, input_messages=None) -> str:
         """By default (when input_messages is None), use the Agent's own growing sequence of messages (ongoing conversation).
         However, for controlled evaluation enable sending a controlled conversation-prefix as input_messages to see how the agent's LLM would react (with the forced response format).
@@ -178,17 +285,94 @@ Available tools:
             input_messages = self.messages
         if self.verbose:
             print(input_messages[-1])
-        response = ollama.chat(
+        chat_func = self.chat_func or _ollama().chat
+        response = chat_func(
             model=self.model_name,
             messages=input_messages,
             think=False,
-            format=self.llm_response_schema
+            format=self.llm_response_schema,
+            keep_alive=self.keep_alive
         )
         resp = response["message"]["content"]
         if self.verbose:
             print({'role':'assistant', 'content':resp})
         return resp
     
+    def _handle_llm_response(self, llm_response:str) -> tuple[str, dict]:
+        """
+        Append the LLM's response to the conversation, parse it and validate it.
+
+        Returns:
+        - tool_name (str): the tool the LLM chose (may be the dummy tool respond_to_user).
+        - tool_args (dict): the arguments for that tool.
+        """
+        self.messages.append({"role": self.ROLE_ASSISTANT, "content": llm_response})
+        try:
+            llm_obj = json.loads(llm_response)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"LLM returned invalid JSON: {llm_response}") from e
+                    
+        tool_name = llm_obj.get(self.KEY_TOOL, None)
+        tool_args = llm_obj.get(self.KEY_ARGS, None)
+
+        if tool_name is None:
+            raise ValueError(f"LLM returned a JSON without the required field {self.KEY_TOOL}. JSON: {llm_response}")
+        if tool_args is None:
+            raise ValueError(f"LLM returned a JSON without the required field {self.KEY_ARGS}. JSON: {llm_response}")
+        if tool_name not in self.tools:
+            raise ValueError(f"LLM returned a JSON with unsupported tool name '{tool_name}'. JSON: {llm_response}")
+        return (tool_name, tool_args)
+
+    def _call_tool(self, tool_name:str, tool_args:dict) -> dict:
+        """
+        Call the tool and wrap its result (or its error) as the content of a tool-response message.
+        """
+        tool_func = self.tools[tool_name]
+        tool_content = {self.KEY_RESP_TOOL_NAME: tool_name}
+        try:
+            tool_result = tool_func(**tool_args)
+            tool_content[self.KEY_STATUS] = self.STATUS_OK
+            tool_content[self.KEY_RESULT] = tool_result
+        except Exception as ex:
+            tool_content[self.KEY_STATUS] = self.STATUS_ER
+            tool_content[self.KEY_ERROR] = str(ex)
+        return tool_content
+
+    def _append_tool_response(self, tool_content:dict):
+        tool_message = {"role": self.ROLE_TOOL, "content": json.dumps(tool_content, ensure_ascii=False)}
+        self.messages.append(tool_message)
+
+    def _route_turn(self) -> str:
+        """
+        Try to handle the latest user message with the router (without the LLM).
+        The tool calls, tool responses and the response to the user are written to the conversation as if the LLM did them.
+        If a routed tool call fails, the LLM takes over from there (it sees the error, as usual).
+
+        Returns:
+        - the response text for the user, or None if the turn should continue with the LLM.
+        """
+        start = time.perf_counter()
+        tool_calls = self.router.parse(self.messages[-1]["content"])
+        if not tool_calls:
+            self.router.record(routed=False, latency=time.perf_counter() - start)
+            return None
+        results = []
+        for (tool_name, tool_args) in tool_calls:
+            self.messages.append({"role": self.ROLE_ASSISTANT, "content": json.dumps({self.KEY_TOOL: tool_name, self.KEY_ARGS: tool_args}, ensure_ascii=False)})
+            tool_content = self._call_tool(tool_name, tool_args)
+            self._append_tool_response(tool_content)
+            if tool_content[self.KEY_STATUS] != self.STATUS_OK:
+                self.router.record(routed=False, latency=time.perf_counter() - start, tool_error=True)
+                return None
+            results.append(tool_content[self.KEY_RESULT])
+        text = self.router.compose_response(tool_calls, results)
+        self.messages.append({"role": self.ROLE_ASSISTANT, "content": json.dumps({self.KEY_TOOL: self.TOOL_RESPOND_TO_USER, self.KEY_ARGS: {self.SUBKEY_TEXT: text}}, ensure_ascii=False)})
+        self.router.record(routed=True, latency=time.perf_counter() - start)
+        return text
+
+    def _gave_up_message(self) -> str:
+        return f"Agent tried {self.MAX_STEPS_PER_TURN} steps to handle the request, then gave up"
+
     def ask(self, user_message:str) -> str:
         """
         The main entry point to interact with the agent.
@@ -197,42 +381,49 @@ Available tools:
         """
 
         self.messages.append({"role": self.ROLE_USER, "content": user_message})
+        if self.router:
+            routed_response = self._route_turn()
+            if routed_response is not None:
+                return routed_response
 
         for iter in range(self.MAX_STEPS_PER_TURN):
             llm_response = self._call_llm()
-            self.messages.append({"role": self.ROLE_ASSISTANT, "content": llm_response})
-            try:
-                llm_obj = json.loads(llm_response)
-            except json.JSONDecodeError as e:
-                raise ValueError(f"LLM returned invalid JSON: {llm_response}") from e
-                        
-            tool_name = llm_obj.get(self.KEY_TOOL, None)
-            tool_args = llm_obj.get(self.KEY_ARGS, None)
-
-            if tool_name is None:
-                raise ValueError(f"LLM returned a JSON without the required field {self.KEY_TOOL}. JSON: {llm_response}")
-            if tool_args is None:
-                raise ValueError(f"LLM returned a JSON without the required field {self.KEY_ARGS}. JSON: {llm_response}")
-            
+            (tool_name, tool_args) = self._handle_llm_response(llm_response)
             if tool_name == self.TOOL_RESPOND_TO_USER:
                 return self._respond_to_user(**tool_args)
-            
-            tool_func = self.tools.get(tool_name, None)
-            if tool_func is None:
-                raise ValueError(f"LLM returned a JSON with unsupported tool name '{tool_name}'. JSON: {llm_response}")
-            
-            tool_content = {self.KEY_RESP_TOOL_NAME: tool_name}
-            try:
-                tool_result = tool_func(**tool_args)
-                tool_content[self.KEY_STATUS] = self.STATUS_OK
-                tool_content[self.KEY_RESULT] = tool_result
-            except Exception as ex:
-                tool_content[self.KEY_STATUS] = self.STATUS_ER
-                tool_content[self.KEY_ERROR] = str(ex)
-            tool_message = {"role": self.ROLE_TOOL, "content": json.dumps(tool_content, ensure_ascii=False)}
-            self.messages.append(tool_message)
+            tool_content = self._call_tool(tool_name, tool_args)
+            self._append_tool_response(tool_content)
         
-        return f"Agent tried {self.MAX_STEPS_PER_TURN} steps to handle the request, then gave up"
+        return self._gave_up_message()
+
+    async def ask_async(self, user_message:str, llm_semaphore:asyncio.Semaphore=None, executor:concurrent.futures.Executor=None) -> str:
+        """
+        Same as ask(), but as a coroutine, so many agents (sessions) can be served concurrently from one event loop.
+        The blocking LLM calls and tool calls run in the executor (default: the loop's default thread pool).
+        If llm_semaphore is given (an asyncio.Semaphore, or any async context manager like service.LLMSlots), every LLM call first waits for it
+        (to limit the number of concurrent calls to the LLM server; the rest wait in a queue).
+        """
+        loop = asyncio.get_running_loop()
+        self.messages.append({"role": self.ROLE_USER, "content": user_message})
+        if self.router:
+            routed_response = await loop.run_in_executor(executor, self._route_turn)
+            if routed_response is not None:
+                return routed_response
+
+        for iter in range(self.MAX_STEPS_PER_TURN):
+            input_messages = list(self.messages)
+            if llm_semaphore is None:
+                llm_response = await loop.run_in_executor(executor, self._call_llm, input_messages)
+            else:
+                async with llm_semaphore:
+                    llm_response = await loop.run_in_executor(executor, self._call_llm, input_messages)
+            (tool_name, tool_args) = self._handle_llm_response(llm_response)
+            if tool_name == self.TOOL_RESPOND_TO_USER:
+                return self._respond_to_user(**tool_args)
+            tool_content = await loop.run_in_executor(executor, self._call_tool, tool_name, tool_args)
+            self._append_tool_response(tool_content)
+        
+        return self._gave_up_message()
 
 
 
@@ -243,12 +434,13 @@ class AgentUI:
     ROLE_TOOLCALL = "Tool call"
     ROLE_TOOLRESP = "Tool response"
 
-    def __init__(self, model_name:str=None, verbose:bool=False, html=True):
+    def __init__(self, model_name:str=None, verbose:bool=False, html=True, warmup:bool=False, keep_alive:str|float=None, use_router:bool=False):
         """
         model_name None is useful if you want to use the UI functionality for offline display of conversations,
         but for live conversation you need to pick a model_name that is available locally via ollama ;-)
+        warmup, keep_alive and use_router are passed to the Agent (see Agent.__init__).
         """
-        self.agent = Agent(model_name, verbose=verbose)
+        self.agent = Agent(model_name, verbose=verbose, warmup=warmup, keep_alive=keep_alive, use_router=use_router)
         self.html = html
         self.verbose = verbose
         if self.verbose:
@@ -259,6 +451,7 @@ class AgentUI:
     def display_convo(self, messages, skip_system=False, system_start_vis=False, toolcall_start_vis=False, toolresp_start_vis=False):
         convo = self.get_pretty_convo(messages, skip_system=skip_system, system_start_vis=system_start_vis, toolcall_start_vis=toolcall_start_vis, toolresp_start_vis=toolresp_start_vis)
         if self.html:
+            from IPython.display import HTML, display
             display(HTML(convo))
         else:
             print(convo)
@@ -376,6 +569,7 @@ function toggleMessage(id, header) {{
     def display_message(self, role, msg):
         message_div = self.get_message_div(role, msg)
         if self.html:
+            from IPython.display import HTML, display
             display(HTML(message_div))
         else:
             print(message_div)
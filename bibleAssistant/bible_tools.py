@@ -1,11 +1,13 @@
 """
 This module provides helpful tools for Biblical research and for an AI Agent assistant.
 """
+import os
 import json
-import requests
+import functools
 import urllib.parse
 import sefaria.sefaria_code as sef
-from bs4 import BeautifulSoup
+from . import name_resolver as nr
+# requests and bs4 are imported lazily inside the tools that need them (keep the import of this module fast).
 
 supported_books = [
     sef.BookCode.GENESIS,
@@ -24,6 +26,71 @@ supported_versions = [
     sef.VersionCode.EN_KOREN,
 ]
 
+# The resolvers know all the books and versions in the catalog (not only the supported ones),
+# so a real but unsupported name (e.g., "Nehemiah") is recognized as such, instead of being "fixed" into a similar supported name (e.g., "jeremiah").
+book_resolver = nr.NameResolver({book: nr.book_aliases.get(book, []) for book in sef.book_code2info})
+version_resolver = nr.NameResolver({version: [sef.version_code2name[version]] + nr.version_aliases.get(version, []) for version in sef.version_code2info})
+
+def resolve_book(book:str, supported_only:bool=True) -> str:
+    """
+    Resolve a (possibly misspelled or abbreviated) book name into a book code (by default, only a supported book code).
+    Raise ValueError (with ranked suggestions) if the name is unknown, unsupported or really ambiguous.
+    """
+    allowed = supported_books if supported_only else list(sef.book_code2info)
+    (code, suggestions) = book_resolver.resolve(book)
+    if code in allowed:
+        return code
+    suggestions = [(code, score) for (code, score) in suggestions if code in allowed]
+    if (not code) and suggestions:
+        err_msg = f"Couldn't decide which book '{book}' refers to. Did you mean one of these: {', '.join([code for (code, score) in suggestions])}?"
+    else:
+        err_msg = f"We don't support book named '{book}'. Here are the supported books: {', '.join(allowed)}"
+    raise ValueError(err_msg)
+
+def resolve_version(version:str, supported_only:bool=True) -> str:
+    """
+    Resolve a (possibly misspelled or abbreviated) version name into a version code (by default, only a supported version code).
+    Raise ValueError (with ranked suggestions) if the name is unknown, unsupported or really ambiguous.
+    """
+    allowed = supported_versions if supported_only else list(sef.version_code2info)
+    (code, suggestions) = version_resolver.resolve(version)
+    if code in allowed:
+        return code
+    suggestions = [(code, score) for (code, score) in suggestions if code in allowed]
+    if (not code) and suggestions:
+        err_msg = f"Couldn't decide which text-version '{version}' refers to. Did you mean one of these versions:"
+        candidates = [code for (code, score) in suggestions]
+    else:
+        err_msg = f"We don't support text-version named '{version}'. Here are the supported versions:"
+        candidates = allowed
+    for candidate in candidates:
+        desc = sef.version_code2info[candidate].get("short_desc", sef.version_code2name[candidate])
+        err_msg += f"\n  Version: '{candidate}'. Description: {desc}"
+    raise ValueError(err_msg)
+
+@functools.lru_cache(maxsize=None)
+def read_book_text(book:str, version:str) -> list[list[str]]:
+    """
+    Read the (raw) text of a whole book in a specific version, as a list of chapters, each a list of verses.
+    The result is cached in memory, so all the agents (sessions) in the process share a single copy of the corpus, and only the first lookup pays for reading the file.
+    """
+    local = sef.sefaria_local(book, version)
+    with open(local, 'r', encoding='utf-8') as f:
+        book_data = json.load(f)
+    return book_data["text"]
+
+def read_verse(book:str, version:str, chapter_num:int, verse_num:int) -> str:
+    """
+    The (raw) text of a verse. Raise ValueError (with the valid range) if the chapter or the verse doesn't exist in the book.
+    """
+    book_text = read_book_text(book, version)
+    if not (1 <= chapter_num <= len(book_text)):
+        raise ValueError(f"The book '{book}' has chapters 1-{len(book_text)}, there is no chapter {chapter_num}.")
+    chapter = book_text[chapter_num-1]
+    if not (1 <= verse_num <= len(chapter)):
+        raise ValueError(f"Chapter {chapter_num} of the book '{book}' has verses 1-{len(chapter)}, there is no verse {verse_num}.")
+    return chapter[verse_num-1]
+
 def lookup_verse(version:str, book:str, chapter_num:int, verse_num:int) -> dict:
     """
     Get the text of a specific verse from the bible.
@@ -38,23 +105,10 @@ def lookup_verse(version:str, book:str, chapter_num:int, verse_num:int) -> dict:
     - dictionary with fields version, book, chapter_num, and verse_num coppied from the input arguments, and an additional field:
         - text (str): the text of the requested verse
     """
-    book = book.strip().lower()
-    if book not in supported_books:
-        err_msg = f"We don't support book named '{book}'. Here are the supported books: {', '.join(supported_books)}"
-        raise ValueError(err_msg)
-    
-    version = version.strip().lower()
-    if version not in supported_versions:
-        err_msg = f"We don't support text-version named '{version}'. Here are the supported versions:"
-        for version in supported_versions:
-            (version_name, desc, exam) = sef.version_code2metadata(version, use_short_desc=True)
-            err_msg += f"\n  Version: '{version}'. Description: {desc}"
-        raise ValueError(err_msg)
+    book = resolve_book(book)
+    version = resolve_version(version)
     
-    local = sef.sefaria_local(book, version)
-    with open(local, 'r', encoding='utf-8') as f:
-        book_data = json.load(f)
-    verse = book_data["text"][chapter_num-1][verse_num-1]
+    verse = read_verse(book, version, chapter_num, verse_num)
     verse = sef.clean_html_with_bs4(verse)
     ret = {
         "version": version,
@@ -66,6 +120,9 @@ def lookup_verse(version:str, book:str, chapter_num:int, verse_num:int) -> dict:
     return ret
 
 def clean_html_with_bs4(raw_html):
+    if ('<' not in raw_html) and ('&' not in raw_html):
+        return raw_html
+    from bs4 import BeautifulSoup
     soup = BeautifulSoup(raw_html, "html.parser") # Parse the HTML content
     clean_text = soup.get_text(strip=False) # Extract all text, stripping extra whitespace
     return clean_text
@@ -86,6 +143,7 @@ def search_phrase(phrase:str, n_max_results:int=10) -> dict:
         - verse_num (int): the verse number inside the chapter
         - text (str): the text of the found verse (this text should include the searched phrase as a substring)
     '''
+    import requests
     book_map_url = "https://bolls.life/get-books/YLT/"
     try:
         book_map_resp = requests.get(book_map_url)
@@ -120,4 +178,73 @@ def search_phrase(phrase:str, n_max_results:int=10) -> dict:
         results.append(res)
 
     results_dict = {"results": results}
-    return results_dict
\ No newline at end of file
+    return results_dict
+
+def search_pattern(pattern:str, mode:str="wildcard", version:str="he.text_only", n_max_results:int=10) -> dict:
+    '''
+    Search the bible (locally) for verses that match a pattern - more flexible than search_phrase.
+
+    Args:
+    - pattern (str): the pattern to search for.
+        In "wildcard" mode: whole words, where "*" stands for any letters inside a word and "?" for a single letter (e.g., "ער*ם").
+        Hebrew prefix letters (ו/ה/ב/ל/מ/ש/כ) are allowed before every word (e.g., "ערום" also finds "והערום").
+        In "regex" mode: a regular expression (useful for the English translations).
+    - mode (str): "wildcard" or "regex". Default: "wildcard"
+    - version (str): the code name of a specific bible version or translation to search in, or "all" to search in all versions. Default: "he.text_only"
+    - n_max_results (int): the maximum number of results to return. Default: 10
+
+    Returns:
+    - dictionary with a field "results" of the matching verses - a list of items, each is a dictionary with fields:
+        - book (str): the name of the biblical book
+        - version (str): the version of the text
+        - chapter_num (int): the chapter number inside the book
+        - verse_num (int): the verse number inside the chapter
+        - text (str): the text of the found verse
+    '''
+    from . import corpus_search
+    versions = None if version.strip().lower() == "all" else [resolve_version(version)]
+    results = corpus_search.search_corpus(pattern, mode=mode, books=supported_books, versions=versions, hebrew_prefixes=(mode == corpus_search.MODE_WILDCARD), n_max_results=n_max_results)
+    return {"results": results}
+
+
+def compare_versions(book:str, version_a:str, version_b:str, chapter_num:int, verse_num:int) -> dict:
+    '''
+    Compare how a specific verse is written in two different bible versions (or translations), word by word.
+    Returns only the differences, instead of the two full texts.
+
+    Args:
+    - book (str): the name of the book from the bible
+    - version_a (str): the code name of the first bible version or translation (any known version, not only the supported ones)
+    - version_b (str): the code name of the second bible version or translation (any known version, not only the supported ones)
+    - chapter_num (int): chapter number inside the book
+    - verse_num (int): verse number inside the chapter
+
+    Returns:
+    - dictionary with fields book, version_a, version_b, chapter_num, and verse_num, and additional fields:
+        - similarity (float): between 0 (completely different) and 1 (the same words)
+        - differences (list): each item is a dictionary with fields:
+            - change (str): "replace", "delete" (words only in version_a) or "insert" (words only in version_b)
+            - text_a (str): the words in version_a
+            - text_b (str): the words in version_b
+    '''
+    from . import version_diff
+    book = resolve_book(book)
+    # Any version in the catalog can be compared (e.g., JPS 1917 vs JPS 2006), as long as it was downloaded:
+    version_a = resolve_version(version_a, supported_only=False)
+    version_b = resolve_version(version_b, supported_only=False)
+    for version in [version_a, version_b]:
+        if not os.path.exists(sef.sefaria_local(book, version)):
+            raise ValueError(f"The text-version '{version}' of the book '{book}' is not available locally.")
+    text_a = read_verse(book, version_a, chapter_num, verse_num)
+    text_b = read_verse(book, version_b, chapter_num, verse_num)
+    diff = version_diff.diff_verse(text_a, text_b)
+    ret = {
+        "book": book,
+        "version_a": version_a,
+        "version_b": version_b,
+        "chapter_num": chapter_num,
+        "verse_num": verse_num,
+        "similarity": round(diff["similarity"], 3),
+        "differences": [{"change": tag, "text_a": words_a, "text_b": words_b} for (tag, words_a, words_b) in diff["ops"]]
+    }
+    return ret
@@ -0,0 +1,294 @@
+"""
+This module searches the local corpus (the books downloaded from Sefaria) with patterns, beyond exact whole-word phrases:
+- wildcard patterns: "*" stands for any letters inside a word and "?" for a single letter (e.g., "ער*ם", "?רום"),
+  optionally allowing the Hebrew prefix letters (ו/ה/ב/ל/מ/ש/כ) before every word.
+- regular expressions (e.g., over the English translations: r"\bgarden of \w+").
+
+Verses are pre-normalized once per book and version (HTML and editorial marks removed, Hebrew Nikkud/Ta'amei-Hamikra removed, lowercase) and cached.
+A trigram index per book and version is used as a prefilter, to skip verses that cannot contain the pattern's literal parts.
+The books and versions are scanned in parallel across cores. Hits are either streamed as soon as each book is done, or returned in catalog order (deterministic).
+"""
+import os
+import re
+import html
+import functools
+import concurrent.futures
+import sefaria.sefaria_code as sef
+from . import bible_tools as bblt
+
+HEBREW_PREFIX_LETTERS = "ובלמשהכ"
+MAX_PREFIX_LETTERS = 3
+MIN_LITERAL_LEN = 3
+
+MODE_WILDCARD = "wildcard"
+MODE_REGEX = "regex"
+
+_HTML_BREAK = re.compile(r"<br\s*/?>", re.IGNORECASE)
+_HTML_TAG = re.compile(r"<[^>]+>")
+_HEBREW_MARKS = re.compile(r"[\u0591-\u05BD\u05BF-\u05C7]") # Ta'amei-Hamikra, Nikkud, sof-pasuq etc. (without the Maqaf)
+_MAQAF = "\u05BE"
+_EDITORIAL_MARKS = re.compile(r"\{[^}]*\}") # e.g., the Parasha markers "{פ}" and "{ס}" in HE_MASORAH are not part of the text
+
+def strip_html(text:str) -> str:
+    """
+    Remove HTML tags (a lot faster than BeautifulSoup, which matters when preparing the whole corpus), and collapse whitespace.
+    """
+    text = html.unescape(_HTML_TAG.sub("", _HTML_BREAK.sub(" ", text)))
+    return " ".join(text.split())
+
+def normalize_verse(text:str) -> str:
+    """
+    Normalize a verse for matching: remove HTML tags, editorial marks in curly brackets (e.g., "{פ}"), Hebrew Nikkud and Ta'amei-Hamikra, turn Maqaf into a space, lowercase, and collapse whitespace.
+    """
+    text = _HEBREW_MARKS.sub("", _EDITORIAL_MARKS.sub(" ", strip_html(text))).replace(_MAQAF, " ")
+    return " ".join(text.lower().split())
+
+def _trigrams(text:str) -> set[str]:
+    return {text[i:i+3] for i in range(len(text) - 2)}
+
+@functools.lru_cache(maxsize=None)
+def load_normalized_verses(book:str, version:str) -> tuple[list[tuple[int, int]], list[str], list[str]]:
+    """
+    Read a book (in a specific version) and pre-normalize its verses. Cached (per process).
+
+    Returns:
+    - refs (list of (chapter_num, verse_num) tuples)
+    - texts (list of str): the verses, with HTML removed (for showing the results).
+    - norm_texts (list of str): the normalized verses (for matching).
+    """
+    refs = []
+    texts = []
+    for c, chapter in enumerate(bblt.read_book_text(book, version)):
+        for v, verse in enumerate(chapter):
+            refs.append((c + 1, v + 1))
+            texts.append(strip_html(verse))
+    norm_texts = [normalize_verse(text) for text in texts]
+    return (refs, texts, norm_texts)
+
+@functools.lru_cache(maxsize=None)
+def trigram_index(book:str, version:str) -> dict[str, list[int]]:
+    """
+    Trigram index of the normalized verses: trigram -> sorted list of verse indices that contain it. Cached (per process).
+    """
+    (refs, texts, norm_texts) = load_normalized_verses(book, version)
+    index = {}
+    for i, norm_text in enumerate(norm_texts):
+        for tri in _trigrams(norm_text):
+            index.setdefault(tri, []).append(i)
+    return index
+
+def wildcard_to_regex(pattern:str, hebrew_prefixes:bool=False) -> str:
+    """
+    Translate a wildcard pattern into a regular expression that matches whole words (bounded by non-letters, so "earth" matches "earth." and "earth,").
+    "*" matches any (zero or more) letters inside a word, "?" matches exactly one letter.
+    If hebrew_prefixes is True, every word may also start with up to 3 of the prefix letters ו/ה/ב/ל/מ/ש/כ.
+    """
+    words = normalize_verse(pattern).split()
+    prefix = f"[{HEBREW_PREFIX_LETTERS}]{{0,{MAX_PREFIX_LETTERS}}}" if hebrew_prefixes else ""
+    word_regexes = []
+    for word in words:
+        word_regex = "".join([r"\w*" if c == "*" else r"\w" if c == "?" else re.escape(c) for c in word])
+        word_regexes.append(prefix + word_regex)
+    return r"(?<!\w)" + r"\s+".join(word_regexes) + r"(?!\w)"
+
+def wildcard_literals(pattern:str) -> list[str]:
+    """
+    The literal parts (between wildcards) that every match of the wildcard pattern must contain.
+    """
+    return [part for part in re.split(r"[*?\s]+", normalize_verse(pattern)) if part]
+
+_ESCAPE_N_HEX_DIGITS = {"x": 2, "u": 4, "U": 8}
+
+def _escape_len(pattern:str, i:int) -> int:
+    # The length of the escape sequence that starts (with a backslash) at pattern[i], e.g. 4 for "\x47" and 6 for "\u05d0"
+    c = pattern[i + 1] if i + 1 < len(pattern) else ""
+    if c in _ESCAPE_N_HEX_DIGITS:
+        return 2 + _ESCAPE_N_HEX_DIGITS[c]
+    if c == "N" and pattern.startswith("{", i + 2):
+        j = pattern.find("}", i + 2)
+        return (j + 1 - i) if j > 0 else len(pattern) - i
+    if c.isdigit(): # An octal escape (up to 3 digits) or a group reference
+        j = i + 2
+        while (j < len(pattern)) and (j < i + 4) and pattern[j].isdigit():
+            j += 1
+        return j - i
+    return 2
+
+def _class_end(pattern:str, i:int) -> int:
+    # The index right after the character class that starts (with "[") at pattern[i]
+    j = i + 1
+    if pattern.startswith("^", j):
+        j += 1
+    if pattern.startswith("]", j): # A "]" right at the start is a literal member of the class
+        j += 1
+    while j < len(pattern):
+        if pattern[j] == "\\":
+            j += 2
+        elif pattern[j] == "]":
+            return j + 1
+        else:
+            j += 1
+    return len(pattern)
+
+def regex_literals(pattern:str) -> list[str]:
+    """
+    A conservative extraction of literal strings that every match of the regular expression must contain.
+    Only plain characters at the top level of the pattern are used (not inside groups or character classes, and not followed by an optional quantifier).
+    If the pattern has a top-level alternation ("|"), nothing is required.
+    """
+    literals = []
+    cur = ""
+    depth = 0
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        if c == "\\":
+            (literals, cur) = (literals + [cur], "")
+            i += _escape_len(pattern, i)
+            continue
+        if c == "[":
+            (literals, cur) = (literals + [cur], "")
+            i = _class_end(pattern, i)
+            continue
+        if c == "(":
+            (literals, cur) = (literals + [cur], "")
+            depth += 1
+        elif c == ")":
+            depth -= 1
+        elif c == "|" and depth == 0:
+            return []
+        elif depth == 0 and c in "?*{":
+            cur = cur[:-1] # The previous character may be optional (or repeated)
+            (literals, cur) = (literals + [cur], "")
+            if c == "{":
+                j = pattern.find("}", i)
+                i = j if j > 0 else len(pattern)
+        elif depth == 0 and c in ".^$+":
+            (literals, cur) = (literals + [cur], "")
+        elif depth == 0:
+            cur += c
+        i += 1
+    literals.append(cur)
+    return [normalize_verse(literal) for literal in literals if literal.strip()]
+
+def compile_pattern(pattern:str, mode:str=MODE_WILDCARD, hebrew_prefixes:bool=False) -> tuple[str, list[str]]:
+    """
+    Returns:
+    - regex (str): the regular expression to run over the normalized verses.
+    - literals (list of str): literal strings that every match contains (for the trigram prefilter).
+    """
+    if mode == MODE_WILDCARD:
+        return (wildcard_to_regex(pattern, hebrew_prefixes=hebrew_prefixes), wildcard_literals(pattern))
+    if mode == MODE_REGEX:
+        try:
+            re.compile(pattern) # Fail early on an invalid regular expression
+        except re.error as ex:
+            raise ValueError(f"Invalid regular expression '{pattern}': {ex}")
+        return (pattern, regex_literals(pattern))
+    raise ValueError(f"Unsupported search mode '{mode}'. Supported modes: '{MODE_WILDCARD}', '{MODE_REGEX}'")
+
+def candidate_verses(book:str, version:str, literals:list[str]) -> list[int]:
+    """
+    Use the trigram index to find the verses that may match (contain all the trigrams of all the literals).
+    Returns None if the literals are too short to filter anything (then all the verses are candidates).
+    """
+    trigrams = set()
+    for literal in literals:
+        if len(literal) >= MIN_LITERAL_LEN:
+            trigrams.update(_trigrams(literal))
+    if not trigrams:
+        return None
+    index = trigram_index(book, version)
+    postings = sorted([index.get(tri, []) for tri in trigrams], key=len)
+    candidates = set(postings[0])
+    for posting in postings[1:]:
+        if not candidates:
+            break
+        candidates.intersection_update(posting)
+    return sorted(candidates)
+
+def search_book_version(book:str, version:str, regex:str, literals:list[str], n_max_results:int) -> list[dict]:
+    """
+    Search a single book (in a specific version). This runs inside the worker processes.
+    """
+    (refs, texts, norm_texts) = load_normalized_verses(book, version)
+    compiled = re.compile(regex, re.IGNORECASE)
+    candidates = candidate_verses(book, version, literals)
+    if candidates is None:
+        candidates = range(len(norm_texts))
+    hits = []
+    for i in candidates:
+        if compiled.search(norm_texts[i]):
+            (chapter_num, verse_num) = refs[i]
+            hits.append({"book": book, "version": version, "chapter_num": chapter_num, "verse_num": verse_num, "text": texts[i]})
+            if len(hits) >= n_max_results:
+                break
+    return hits
+
+def available_books_and_versions(books:list[str]=None, versions:list[str]=None) -> list[tuple[str, str]]:
+    """
+    All the (book, version) pairs that were downloaded locally (according to the manifest, see sefaria_code.sefaria_manifest), optionally only some books/versions.
+    """
+    return sef.sefaria_available(books, versions)
+
+_executor = None
+_executor_workers = None
+
+def get_process_pool(n_workers:int) -> concurrent.futures.ProcessPoolExecutor:
+    # The pool is kept alive between calls (and shared with other modules, e.g. version_diff), so the worker processes keep their caches (normalized verses and trigram indices).
+    global _executor, _executor_workers
+    if (_executor is None) or (_executor_workers != n_workers):
+        if _executor is not None:
+            _executor.shutdown(cancel_futures=True)
+        _executor = concurrent.futures.ProcessPoolExecutor(max_workers=n_workers)
+        _executor_workers = n_workers
+    return _executor
+
+def iter_search_corpus(pattern:str, mode:str=MODE_WILDCARD, books:list[str]=None, versions:list[str]=None, hebrew_prefixes:bool=False, n_max_results:int=10, n_workers:int=None, ordered:bool=False):
+    """
+    Search the local corpus for verses that match the pattern, yielding each hit as soon as it is found (per book and version).
+    Stops after n_max_results hits (the remaining work is cancelled).
+
+    Args:
+    - pattern (str): a wildcard pattern or a regular expression (see mode).
+    - mode (str): "wildcard" or "regex".
+    - books, versions (lists of str): limit the search to these books/versions. Default: all that exist locally.
+    - hebrew_prefixes (bool): (wildcard mode) allow Hebrew prefix letters before every word.
+    - n_max_results (int): stop after this many hits.
+    - n_workers (int): number of worker processes. Default: number of cores. 1 means searching in this process (no parallelism).
+    - ordered (bool): yield the hits in catalog order (book, then version), so identical calls return identical hits.
+      Otherwise (faster to the first hit) the books are yielded in the order they finish.
+
+    Yields:
+    - dictionaries with fields book, version, chapter_num, verse_num and text.
+    """
+    (regex, literals) = compile_pattern(pattern, mode=mode, hebrew_prefixes=hebrew_prefixes)
+    pairs = available_books_and_versions(books, versions)
+    n_workers = n_workers or os.cpu_count() or 1
+    n_found = 0
+    if n_workers == 1 or len(pairs) <= 1:
+        for (book, version) in pairs:
+            for hit in search_book_version(book, version, regex, literals, n_max_results - n_found):
+                yield hit
+                n_found += 1
+            if n_found >= n_max_results:
+                return
+        return
+    executor = get_process_pool(n_workers)
+    futures = [executor.submit(search_book_version, book, version, regex, literals, n_max_results) for (book, version) in pairs]
+    try:
+        for future in (futures if ordered else concurrent.futures.as_completed(futures)):
+            for hit in future.result():
+                yield hit
+                n_found += 1
+                if n_found >= n_max_results:
+                    return
+    finally:
+        for future in futures:
+            future.cancel()
+
+def search_corpus(pattern:str, mode:str=MODE_WILDCARD, books:list[str]=None, versions:list[str]=None, hebrew_prefixes:bool=False, n_max_results:int=10, n_workers:int=None) -> list[dict]:
+    """
+    Same as iter_search_corpus, but returns a list of the hits, in catalog order (deterministic, e.g. for the agent's tool).
+    """
+    return list(iter_search_corpus(pattern, mode=mode, books=books, versions=versions, hebrew_prefixes=hebrew_prefixes, n_max_results=n_max_results, n_workers=n_workers, ordered=True))
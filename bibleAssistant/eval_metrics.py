@@ -0,0 +1,156 @@
+"""
+This module calculates evaluation metrics over tested turns (the results of the evaluation module, e.g., read from a JSONL checkpoint file).
+All the calculations are vectorized (pandas/NumPy column operations and group-bys), so they stay fast for large result files.
+
+Metrics:
+- tool_name_accuracy: rate of turns where the LLM chose the expected tool.
+- perfect_args_rate: rate of turns where the LLM chose the expected tool AND all the arguments were as expected.
+- args_accuracy_given_tool: same as perfect_args_rate, but only out of the turns where the tool name was correct.
+- repeat_call_rate: rate of turns where the LLM repeated a previous tool call (same tool, same arguments).
+- perfect_turn_rate: rate of turns with correct tool, correct arguments and no repeat call.
+- perfect_convo_rate: rate of conversations where all the tested turns were perfect.
+"""
+import json
+import numpy as np
+import pandas as pd
+
+HEAVY_COLUMNS = ['input_messages']
+
+def load_results(results_file:str, drop_heavy_columns:bool=True, chunksize:int=10000) -> pd.DataFrame:
+    """
+    Read tested turns from a JSONL file (in chunks, to limit memory), optionally dropping the heavy columns (like the input messages) that the metrics don't need.
+    Lines that can't be decoded (e.g., a partial line left by a crashed run, see evaluation.read_checkpoint) are skipped.
+    """
+    chunks = []
+    records = []
+    def add_chunk():
+        chunk = pd.DataFrame(records)
+        if drop_heavy_columns:
+            chunk = chunk.drop(columns=[col for col in HEAVY_COLUMNS if col in chunk.columns])
+        chunks.append(chunk)
+        records.clear()
+    with open(results_file, 'r', encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                print(f"!!! Ignoring a corrupt line in {results_file}")
+                continue
+            if len(records) >= chunksize:
+                add_chunk()
+    if records:
+        add_chunk()
+    if not chunks:
+        return pd.DataFrame()
+    return pd.concat(chunks, ignore_index=True)
+
+def add_metadata_columns(results_df:pd.DataFrame) -> pd.DataFrame:
+    """
+    Flatten the conversation metadata into columns (e.g., "scenario"), so metrics can be broken down by them.
+    Also add "specific_scenario" which spells out the sequence of scenarios (for conversations with a sequence of user requests).
+    """
+    meta_df = pd.json_normalize(results_df['convo_metadata'].tolist())
+    meta_df.index = results_df.index
+    meta_df = meta_df[[col for col in meta_df.columns if col not in results_df.columns]]
+    results_df = pd.concat([results_df, meta_df], axis=1)
+    if 'scenario' in results_df.columns:
+        specific = results_df['scenario'].astype(str)
+        if 'sequence_of_scenarios' in results_df.columns:
+            has_seq = results_df['sequence_of_scenarios'].notna()
+            specific = specific.where(~has_seq, results_df.loc[has_seq, 'sequence_of_scenarios'].str.join('->'))
+        results_df['specific_scenario'] = specific
+    return results_df
+
+def add_turn_flags(results_df:pd.DataFrame) -> pd.DataFrame:
+    """
+    Add boolean columns (without NaNs) that the metrics are averaged from.
+    args_correct is NaN when the tool name is wrong (arguments were not compared) - that counts as not-perfect args.
+    """
+    results_df = results_df.copy()
+    tool_ok = results_df['tool_name_correct'].to_numpy(dtype=bool)
+    args_ok = (results_df['args_correct'] == True).to_numpy()
+    repeat = (results_df['repeat_tool_call'] == True).to_numpy()
+    results_df['perfect_args'] = tool_ok & args_ok
+    results_df['perfect_turn'] = tool_ok & args_ok & ~repeat
+    return results_df
+
+def calc_metrics(results_df:pd.DataFrame) -> dict:
+    """
+    Calculate the metrics (see module doc) over a set of tested turns.
+    """
+    if 'perfect_turn' not in results_df.columns:
+        results_df = add_turn_flags(results_df)
+    n_turns = len(results_df)
+    if n_turns == 0:
+        return {'n_turns': 0, 'n_convos': 0}
+    tool_ok = results_df['tool_name_correct'].to_numpy(dtype=bool)
+    perfect_args = results_df['perfect_args'].to_numpy(dtype=bool)
+    n_tool_ok = tool_ok.sum()
+    perfect_convos = results_df.groupby('convo_id', sort=False)['perfect_turn'].all()
+    metrics = {
+        'n_turns': n_turns,
+        'n_convos': len(perfect_convos),
+        'tool_name_accuracy': tool_ok.mean(),
+        'perfect_args_rate': perfect_args.mean(),
+        'args_accuracy_given_tool': (perfect_args.sum() / n_tool_ok) if n_tool_ok else np.nan,
+        'repeat_call_rate': (results_df['repeat_tool_call'] == True).mean(),
+        'perfect_turn_rate': results_df['perfect_turn'].mean(),
+        'perfect_convo_rate': perfect_convos.mean()
+    }
+    return metrics
+
+def calc_metrics_by(results_df:pd.DataFrame, by:str|list[str]) -> pd.DataFrame:
+    """
+    Break the metrics down by column(s) of the results (e.g., "scenario", "specific_scenario" or "expected_tool_name").
+    Returns a table with one row per group and a column per metric.
+    """
+    if 'perfect_turn' not in results_df.columns:
+        results_df = add_turn_flags(results_df)
+    by = [by] if isinstance(by, str) else list(by)
+    flags = results_df[by + ['convo_id', 'tool_name_correct', 'perfect_args', 'perfect_turn']].copy()
+    flags['tool_name_correct'] = flags['tool_name_correct'].astype(bool)
+    flags['repeat_tool_call'] = (results_df['repeat_tool_call'] == True)
+    flags['perfect_args_given_tool'] = flags['perfect_args'].where(flags['tool_name_correct'])
+    groups = flags.groupby(by, sort=True)
+    metrics_df = groups.agg(
+        n_turns=('convo_id', 'size'),
+        n_convos=('convo_id', 'nunique'),
+        tool_name_accuracy=('tool_name_correct', 'mean'),
+        perfect_args_rate=('perfect_args', 'mean'),
+        args_accuracy_given_tool=('perfect_args_given_tool', 'mean'),
+        repeat_call_rate=('repeat_tool_call', 'mean'),
+        perfect_turn_rate=('perfect_turn', 'mean')
+    )
+    # A conversation counts as perfect within a group if all its tested turns in that group are perfect:
+    perfect_convos = flags.groupby(by + ['convo_id'], sort=False)['perfect_turn'].all()
+    metrics_df['perfect_convo_rate'] = perfect_convos.groupby(level=list(range(len(by)))).mean()
+    return metrics_df
+
+def confusion_matrix(results_df:pd.DataFrame, normalize:bool=False) -> pd.DataFrame:
+    """
+    Tool-name confusion matrix: rows are the expected tool names, columns are the tool names the LLM responded with.
+    If normalize is True, each row is normalized to sum to 1.
+    """
+    return pd.crosstab(results_df['expected_tool_name'], results_df['response_tool_name'], normalize='index' if normalize else False)
+
+def summarize_results_file(results_file:str, by:list[str]=('scenario', 'specific_scenario', 'expected_tool_name')) -> dict:
+    """
+    Load a results file (e.g., an evaluation checkpoint) and calculate everything: overall metrics, the confusion matrix, and breakdowns.
+
+    Returns:
+    - dictionary with fields:
+        - overall (dict): the overall metrics.
+        - confusion (DataFrame): the tool-name confusion matrix.
+        - by_<column> (DataFrame): a metrics breakdown for each of the requested columns (that exist in the results).
+    """
+    results_df = add_turn_flags(add_metadata_columns(load_results(results_file)))
+    summary = {
+        'overall': calc_metrics(results_df),
+        'confusion': confusion_matrix(results_df)
+    }
+    for col in by:
+        if col in results_df.columns:
+            summary[f'by_{col}'] = calc_metrics_by(results_df, col)
+    return summary
@@ -3,11 +3,12 @@ This module is dedicated to evaluating the agent.
 The main method is to use example ("golden") conversations as reference: 
 at various points along the conversation, present the agent with the convo-prefix and see how the LLM responds (under the agent's response-format constraints), then judge it.
 """
+import os
 import json
 import numpy as np
-import pandas as pd
 
 from . import agent
+from . import eval_metrics
 
 def compare_tool_args(ref_args:dict, tested_args:dict) -> tuple[bool, int]:
     """
@@ -78,6 +79,44 @@ def compare_llm_response(ag:agent.Agent, reference_response:str, tested_response
     }
     return comparison_results
 
+def iter_eval_with_ref_conversation(convo_id:str, ref_convo:dict, model_name:str, skip_message_nums:set[int]=None, ag:agent.Agent=None):
+    """
+    Same as eval_with_ref_conversation, but as a generator that yields each tested turn as soon as it is done
+    (useful for saving results on the way, rather than only at the end).
+    Turns whose message_num is in skip_message_nums (e.g., already evaluated in a previous run) are skipped.
+    If ag (an Agent) is given, it is used for calling the LLM (instead of constructing a new agent).
+    """
+    convo_metadata = ref_convo['metadata']
+    convo_messages = ref_convo['messages']
+    if ag is None:
+        ag = agent.Agent(model_name)
+    skip_message_nums = skip_message_nums or set()
+    tested_turn_num = -1
+    for message_num, message_dict in enumerate(convo_messages):
+        if message_dict['role'] != ag.ROLE_ASSISTANT:
+            continue # We're not testing system, user, or tool-response turns.
+        tested_turn_num += 1
+        if message_num in skip_message_nums:
+            continue
+        input_messages = convo_messages[:message_num]
+        reference_response = message_dict['content']
+        tested_response = ag._call_llm(input_messages=input_messages)
+
+        tested_turn = {
+            'convo_id': convo_id,
+            'convo_metadata': convo_metadata,
+            'tested_turn_num': tested_turn_num,
+            'message_num': message_num,
+            'input_messages': input_messages,
+            'reference_response': reference_response,
+            'tested_response': tested_response,
+        }
+
+        comparison_results = compare_llm_response(ag, reference_response, tested_response, input_messages)
+        tested_turn.update(comparison_results)
+
+        yield tested_turn
+
 def eval_with_ref_conversation(convo_id:str, ref_convo:dict, model_name:str):
     """
     Evaluate the agent using a reference conversation.
@@ -108,48 +147,64 @@ def eval_with_ref_conversation(convo_id:str, ref_convo:dict, model_name:str):
         - repeat_tool_call (bool). True iff the tested-LLM generated a repeat tool call, meaning same tool and exactly the same arguments as a previous tool call that appears in the input messages.
             This isn't a judgement yet, but the hidden assumption is that a golden reference convo will never have that (unless I get to tools whose responses are stochastic and merit repeat calls).
     """
-    convo_metadata = ref_convo['metadata']
-    convo_messages = ref_convo['messages']
-    ag = agent.Agent(model_name)
-    tested_turns = []
-    for message_num, message_dict in enumerate(convo_messages):
-        if message_dict['role'] != ag.ROLE_ASSISTANT:
-            continue # We're not testing system, user, or tool-response turns.
-        tested_turn_num = len(tested_turns)
-        input_messages = convo_messages[:message_num]
-        reference_response = message_dict['content']
-        tested_response = ag._call_llm(input_messages=input_messages)
-
-        tested_turn = {
-            'convo_id': convo_id,
-            'convo_metadata': convo_metadata,
-            'tested_turn_num': tested_turn_num,
-            'message_num': message_num,
-            'input_messages': input_messages,
-            'reference_response': reference_response,
-            'tested_response': tested_response,
-        }
-
-        comparison_results = compare_llm_response(ag, reference_response, tested_response, input_messages)
-        tested_turn.update(comparison_results)
+    tested_turns = list(iter_eval_with_ref_conversation(convo_id, ref_convo, model_name))
+    return tested_turns
 
-        tested_turns.append(tested_turn)
-    
+def read_checkpoint(checkpoint_file:str) -> list[dict]:
+    """
+    Read the tested turns that were already saved to a JSONL checkpoint file (one tested turn per line).
+    A partially written last line (e.g., if the run crashed while writing it) is ignored.
+    """
+    tested_turns = []
+    if not os.path.exists(checkpoint_file):
+        return tested_turns
+    with open(checkpoint_file, 'r', encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                tested_turns.append(json.loads(line))
+            except json.JSONDecodeError:
+                print(f"!!! Ignoring a corrupt line in {checkpoint_file}")
     return tested_turns
 
 def calc_stats(tests_subdf):
-    return
-def eval_with_ref_dataset(ref_convos:list[dict], model_name:str):
-    tested_turns = []
-    for convo_id, ref_convo in enumerate(ref_convos):
-        tt_i = eval_with_ref_conversation(convo_id, ref_convo, model_name)
-        tested_turns.extend(tt_i)
-        print(f"Convo {convo_id}. Added {len(tt_i)} tested LLM turns (now collected: {len(tested_turns)})")
-    
-    tests_df = pd.DataFrame(tested_turns)
-    # TODO: Calc metrics (toolname accuracy, perfect args rate, toolname confusion mat, repeat toolcall rate) on sets: whole, group-by expected toolname, group-by convo (to be used for perfect-convo-rate).
-    metrics = {
+    return eval_metrics.calc_metrics(tests_subdf)
 
-    }
+def eval_with_ref_dataset(ref_convos:list[dict], model_name:str, checkpoint_file:str=None):
+    """
+    Evaluate the agent with a dataset of reference conversations (see eval_with_ref_conversation). The convo_id of each conversation is its index in ref_convos.
+
+    If checkpoint_file is given, each tested turn is appended to that JSONL file as soon as it completes.
+    When running again with the same ref_convos and checkpoint_file (e.g., after a crash), turns that are already in the file are skipped (resume).
+
+    Returns:
+    tested_turns (list of dicts): all the tested turns (including the ones read from the checkpoint file).
+    """
+    tested_turns = read_checkpoint(checkpoint_file) if checkpoint_file else []
+    convo2done_message_nums = {}
+    for turn in tested_turns:
+        convo2done_message_nums.setdefault(turn['convo_id'], set()).add(turn['message_num'])
+    if tested_turns:
+        print(f"<== Resuming from {checkpoint_file} with {len(tested_turns)} tested LLM turns already done")
+    ag = agent.Agent(model_name)
+    checkpoint = open(checkpoint_file, 'a', encoding='utf-8') if checkpoint_file else None
+    if checkpoint and checkpoint.tell() > 0:
+        checkpoint.write('\n') # In case the previous run crashed in the middle of a line (empty lines are skipped when reading)
+    try:
+        for convo_id, ref_convo in enumerate(ref_convos):
+            skip_message_nums = convo2done_message_nums.get(convo_id, set())
+            n_added = 0
+            for tested_turn in iter_eval_with_ref_conversation(convo_id, ref_convo, model_name, skip_message_nums=skip_message_nums, ag=ag):
+                tested_turns.append(tested_turn)
+                n_added += 1
+                if checkpoint:
+                    checkpoint.write(json.dumps(tested_turn, ensure_ascii=False) + '\n')
+                    checkpoint.flush()
+            if n_added:
+                print(f"Convo {convo_id}. Added {n_added} tested LLM turns (now collected: {len(tested_turns)})")
+    finally:
+        if checkpoint:
+            checkpoint.close()
 
     return tested_turns
@@ -0,0 +1,273 @@
+"""
+This module compiles the Hebrew text into arrays of letter codes (NumPy uint8), for fast letter-level research:
+letter frequencies, gematria sums per verse/chapter/book, and equidistant letter sequences (ELS, "skip" patterns).
+
+Only the letters are kept (no spaces, punctuation, Nikkud or Ta'amei-Hamikra), so HE_TEXT_ONLY and HE_MASORAH (stripped) give comparable arrays.
+Every letter gets a code: 1-22 for the regular letters (א=1 ... ת=22) and 23-27 for the final forms (ך, ם, ן, ף, ץ). Code 0 is never used.
+Verse boundaries are kept as offsets into the letter array (verse i is codes[verse_offsets[i]:verse_offsets[i+1]]), and chapter/book boundaries are derived from them.
+
+A compiled corpus is saved as .npy files in the cache folder (see version_diff.cache_dir), and is recompiled if one of its source files changed (in a new process, see load_letter_corpus).
+"""
+import os
+import json
+import hashlib
+import functools
+import numpy as np
+import sefaria.sefaria_code as sef
+from . import corpus_search
+from .version_diff import cache_dir
+
+LETTERS = "אבגדהוזחטיכלמנסעפצקרשת"
+FINAL_LETTERS = "ךםןףץ"
+ALPHABET = "\0" + LETTERS + FINAL_LETTERS # ALPHABET[code] is the letter of the code
+N_CODES = len(ALPHABET)
+
+# Final form -> regular form (e.g., to count ם together with מ, or to search an ELS regardless of final forms):
+FINAL2REGULAR = np.arange(N_CODES, dtype=np.uint8)
+for _final, _regular in zip(FINAL_LETTERS, "כמנפצ"):
+    FINAL2REGULAR[ALPHABET.index(_final)] = ALPHABET.index(_regular)
+
+# Gematria value of every code. The final forms have the values of the regular forms, unless using the "large" values (ך=500 ... ץ=900).
+GEMATRIA = np.array([0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 20, 30, 40, 50, 60, 70, 80, 90, 100, 200, 300, 400, 20, 40, 50, 80, 90], dtype=np.int32)
+GEMATRIA_LARGE_FINALS = np.concatenate([GEMATRIA[:23], np.array([500, 600, 700, 800, 900], dtype=np.int32)])
+
+# Unicode code point (minus that of א) -> letter code. The Hebrew letters are the contiguous block U+05D0-U+05EA.
+_FIRST_LETTER = ord("א")
+_CHAR2CODE = np.zeros(ord("ת") - _FIRST_LETTER + 1, dtype=np.uint8)
+for _code, _letter in enumerate(ALPHABET[1:], start=1):
+    _CHAR2CODE[ord(_letter) - _FIRST_LETTER] = _code
+
+LEVEL_VERSE = "verse"
+LEVEL_CHAPTER = "chapter"
+LEVEL_BOOK = "book"
+
+def text_to_codes(text:str) -> np.ndarray:
+    """
+    Encode a text into letter codes, keeping only the Hebrew letters.
+    """
+    chars = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32).astype(np.int64) - _FIRST_LETTER
+    chars = chars[(chars >= 0) & (chars < len(_CHAR2CODE))]
+    codes = _CHAR2CODE[chars]
+    return codes[codes > 0]
+
+def codes_to_text(codes:np.ndarray) -> str:
+    return "".join([ALPHABET[code] for code in codes])
+
+def gematria_value(text:str, large_finals:bool=False) -> int:
+    """
+    Gematria value of a word or phrase (sum of the values of its letters).
+    """
+    values = GEMATRIA_LARGE_FINALS if large_finals else GEMATRIA
+    return int(values[text_to_codes(text)].sum())
+
+class LetterCorpus:
+    """
+    The letters of some books (in one Hebrew version) as a single array of codes, with the verse boundaries.
+
+    Attributes:
+    - version (str): version code.
+    - books (list of str): book codes, in order.
+    - codes (np.ndarray of uint8): letter codes of all the books, one after the other.
+    - verse_offsets (np.ndarray of int64): start offset of every verse in codes, plus a last entry with the total number of letters.
+    - verse_refs (np.ndarray of int32, shape (n_verses, 3)): (book index, chapter_num, verse_num) of every verse.
+    """
+    def __init__(self, version:str, books:list[str], codes:np.ndarray, verse_offsets:np.ndarray, verse_refs:np.ndarray):
+        self.version = version
+        self.books = books
+        self.codes = codes
+        self.verse_offsets = verse_offsets
+        self.verse_refs = verse_refs
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def segment_offsets(self, level:str=LEVEL_VERSE) -> np.ndarray:
+        """
+        Start offsets of the segments (verses, chapters or books) in codes, plus a last entry with the total number of letters.
+        """
+        if level == LEVEL_VERSE:
+            return self.verse_offsets
+        return self.verse_offsets[self._segment_first_verses(level)]
+
+    def segment_refs(self, level:str=LEVEL_VERSE) -> list[tuple]:
+        """
+        The reference of every segment: (book, chapter_num, verse_num) for verses, (book, chapter_num) for chapters, or (book,) for books.
+        """
+        n_fields = {LEVEL_VERSE: 3, LEVEL_CHAPTER: 2, LEVEL_BOOK: 1}[level]
+        first_verses = self._segment_first_verses(level)[:-1]
+        return [(self.books[ref[0]],) + tuple([int(x) for x in ref[1:n_fields]]) for ref in self.verse_refs[first_verses]]
+
+    def _segment_first_verses(self, level:str) -> np.ndarray:
+        # Index of the first verse of every segment, plus n_verses at the end
+        n_verses = len(self.verse_refs)
+        if level == LEVEL_VERSE:
+            return np.arange(n_verses + 1)
+        if level == LEVEL_CHAPTER:
+            keys = self.verse_refs[:, :2]
+        elif level == LEVEL_BOOK:
+            keys = self.verse_refs[:, :1]
+        else:
+            raise ValueError(f"Unsupported level '{level}'. Supported levels: '{LEVEL_VERSE}', '{LEVEL_CHAPTER}', '{LEVEL_BOOK}'")
+        is_first = np.ones(n_verses, dtype=bool)
+        is_first[1:] = (keys[1:] != keys[:-1]).any(axis=1)
+        return np.append(np.flatnonzero(is_first), n_verses)
+
+    def positions_to_refs(self, positions:np.ndarray) -> np.ndarray:
+        """
+        For letter positions (offsets in codes), the (book index, chapter_num, verse_num) of the verses that contain them.
+        """
+        verse_indices = np.searchsorted(self.verse_offsets, positions, side="right") - 1
+        return self.verse_refs[verse_indices]
+
+    def letter_histogram(self, merge_finals:bool=False, level:str=None) -> np.ndarray:
+        """
+        Count every letter.
+
+        Args:
+        - merge_finals (bool): count the final forms together with the regular forms.
+        - level (str): None for the whole corpus, or "verse"/"chapter"/"book" for a histogram per segment.
+
+        Returns:
+        - np.ndarray with a count per letter code (index = code, see ALPHABET), of shape (N_CODES,), or (n_segments, N_CODES) per segment.
+        """
+        codes = FINAL2REGULAR[self.codes] if merge_finals else self.codes
+        if level is None:
+            return np.bincount(codes, minlength=N_CODES)
+        offsets = self.segment_offsets(level)
+        n_segments = len(offsets) - 1
+        segment_ids = np.repeat(np.arange(n_segments), np.diff(offsets))
+        return np.bincount(segment_ids * N_CODES + codes, minlength=n_segments * N_CODES).reshape(n_segments, N_CODES)
+
+    def letter_frequencies(self, merge_finals:bool=False) -> dict[str, float]:
+        """
+        The relative frequency of every letter in the corpus, from the most frequent.
+        """
+        counts = self.letter_histogram(merge_finals=merge_finals)
+        total = max(int(counts.sum()), 1)
+        return {ALPHABET[code]: float(counts[code] / total) for code in np.argsort(-counts) if code > 0 and counts[code] > 0}
+
+    def gematria(self, level:str=LEVEL_VERSE, large_finals:bool=False) -> np.ndarray:
+        """
+        The gematria sum of every segment (verse, chapter or book). See segment_refs for the references of the segments.
+        """
+        values = (GEMATRIA_LARGE_FINALS if large_finals else GEMATRIA)[self.codes]
+        cumsum = np.concatenate([[0], np.cumsum(values, dtype=np.int64)])
+        offsets = self.segment_offsets(level)
+        return cumsum[offsets[1:]] - cumsum[offsets[:-1]]
+
+    def els_search(self, word:str, min_skip:int=1, max_skip:int=100, backward:bool=True, merge_finals:bool=True, n_max_results:int=None) -> list[dict]:
+        """
+        Find equidistant letter sequences (ELS): the letters of the word at a fixed distance (skip) from each other, anywhere in the corpus.
+        For every skip, the corpus is viewed (without copying) as overlapping rows of letters at that distance, and only the rows that start with the word's first letter are compared (letter by letter).
+
+        Args:
+        - word (str): Hebrew word (only its letters are used).
+        - min_skip, max_skip (int): the range of skips to search (a skip of 1 means consecutive letters).
+        - backward (bool): also search for the word written backward (negative skips).
+        - merge_finals (bool): ignore the difference between final and regular letter forms.
+        - n_max_results (int): stop after this many hits (None for all).
+
+        Returns:
+        - list of dictionaries with fields skip (negative for backward), start (offset of the word's first letter), book, chapter_num and verse_num (where the word's first letter is).
+          Ordered by absolute skip.
+        """
+        word_codes = text_to_codes(word)
+        if len(word_codes) < 2:
+            raise ValueError(f"An ELS search needs a word with at least 2 letters (got '{word}')")
+        codes = FINAL2REGULAR[self.codes] if merge_finals else self.codes
+        if merge_finals:
+            word_codes = FINAL2REGULAR[word_codes]
+        patterns = [(1, word_codes)] + ([(-1, word_codes[::-1])] if backward and (not np.array_equal(word_codes, word_codes[::-1])) else [])
+        first_positions = {direction: np.flatnonzero(codes == pattern[0]) for (direction, pattern) in patterns}
+        n_letters = len(codes)
+        length = len(word_codes)
+        (skips, starts) = ([], [])
+        n_found = 0
+        for skip in range(max(min_skip, 1), max_skip + 1):
+            n_rows = n_letters - (length - 1) * skip
+            if n_rows <= 0:
+                break
+            rows = np.lib.stride_tricks.as_strided(codes, shape=(n_rows, length), strides=(codes.strides[0], codes.strides[0] * skip), writeable=False)
+            for (direction, pattern) in patterns:
+                candidates = first_positions[direction]
+                candidates = candidates[candidates < n_rows]
+                for k in range(1, length): # Compare letter by letter, so the candidates quickly get fewer
+                    candidates = candidates[rows[candidates, k] == pattern[k]]
+                # A backward match is found as the reversed word read forward, so the word's first letter is at the end of the row:
+                starts.append(candidates if direction == 1 else candidates + (length - 1) * skip)
+                skips.append(np.full(len(candidates), direction * skip))
+                n_found += len(candidates)
+            if (n_max_results is not None) and (n_found >= n_max_results):
+                break
+        starts = np.concatenate(starts)[:n_max_results] if starts else np.zeros(0, dtype=np.int64)
+        skips = np.concatenate(skips)[:n_max_results] if skips else np.zeros(0, dtype=np.int64)
+        refs = self.positions_to_refs(starts)
+        return [{"skip": int(skip), "start": int(start), "book": self.books[ref[0]], "chapter_num": int(ref[1]), "verse_num": int(ref[2])} for (skip, start, ref) in zip(skips, starts, refs)]
+
+    def els_letters(self, start:int, skip:int, length:int) -> str:
+        """
+        The letters of an ELS (e.g., to show a hit of els_search).
+        """
+        return codes_to_text(self.codes[start + np.arange(length) * skip])
+
+def compile_letter_corpus(version:str=sef.VersionCode.HE_TEXT_ONLY, books:list[str]=None) -> LetterCorpus:
+    """
+    Compile books (default: the Torah) of a Hebrew version into a LetterCorpus.
+    The verses are normalized like for the pattern search (see corpus_search.normalize_verse), e.g. Nikkud, Ta'amei-Hamikra and editorial marks in curly brackets are stripped.
+    """
+    if not version.startswith("he."):
+        raise ValueError(f"Letter codes are only supported for Hebrew versions (got '{version}')")
+    books = books or sef.books_in_section("torah")
+    texts = []
+    verse_refs = []
+    for (b, book) in enumerate(books):
+        (refs, raw_texts, norm_texts) = corpus_search.load_normalized_verses(book, version)
+        texts.extend(norm_texts)
+        verse_refs.extend([(b, c, v) for (c, v) in refs])
+    # Encode the whole corpus at once, with a separator between the verses to find the verse boundaries:
+    chars = np.frombuffer("\n".join(texts).encode("utf-32-le"), dtype=np.uint32)
+    verse_ids = np.cumsum(chars == ord("\n"))
+    indices = chars.astype(np.int64) - _FIRST_LETTER
+    in_block = (indices >= 0) & (indices < len(_CHAR2CODE))
+    codes = np.zeros(len(chars), dtype=np.uint8)
+    codes[in_block] = _CHAR2CODE[indices[in_block]]
+    is_letter = codes > 0
+    verse_lengths = np.bincount(verse_ids[is_letter], minlength=len(texts))
+    verse_offsets = np.concatenate([[0], np.cumsum(verse_lengths)]).astype(np.int64)
+    return LetterCorpus(version, list(books), codes[is_letter], verse_offsets, np.array(verse_refs, dtype=np.int32).reshape(-1, 3))
+
+def _source_stamps(version:str, books:list[str]) -> dict:
+    stamps = {}
+    for book in books:
+        local = sef.sefaria_local(book, version)
+        if not os.path.exists(local):
+            raise ValueError(f"Missing local file for book '{book}' in version '{version}': {local}")
+        stamps[book] = os.path.getmtime(local)
+    return stamps
+
+@functools.lru_cache(maxsize=None)
+def _load_letter_corpus(version:str, books:tuple[str], use_cache:bool) -> LetterCorpus:
+    stamps = _source_stamps(version, books)
+    prefix = os.path.join(cache_dir(), f"letters.{version}.{hashlib.sha1(','.join(books).encode('utf-8')).hexdigest()[:12]}")
+    if use_cache and os.path.exists(f"{prefix}.json"):
+        with open(f"{prefix}.json", 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if (meta["books"] == list(books)) and (meta["sources"] == stamps):
+            return LetterCorpus(version, list(books), np.load(f"{prefix}.codes.npy"), np.load(f"{prefix}.verse_offsets.npy"), np.load(f"{prefix}.verse_refs.npy"))
+    corpus = compile_letter_corpus(version, list(books))
+    if use_cache:
+        np.save(f"{prefix}.codes.npy", corpus.codes)
+        np.save(f"{prefix}.verse_offsets.npy", corpus.verse_offsets)
+        np.save(f"{prefix}.verse_refs.npy", corpus.verse_refs)
+        with open(f"{prefix}.json", 'w', encoding='utf-8') as f: # Written last, so a partially saved corpus is never used
+            json.dump({"version": version, "books": list(books), "sources": stamps}, f)
+    return corpus
+
+def load_letter_corpus(version:str=sef.VersionCode.HE_TEXT_ONLY, books:list[str]=None, use_cache:bool=True) -> LetterCorpus:
+    """
+    Get the LetterCorpus of books (default: the Torah) in a Hebrew version: from memory, from the .npy files in the cache folder, or by compiling it (and saving the .npy files).
+    The .npy files are recompiled when a source file changed (by modification time). The in-memory copy is kept for the life of the process
+    (like the texts it is compiled from, see bible_tools.read_book_text), so a source file that changes while the process runs is only picked up by a new process.
+    """
+    books = books or sef.books_in_section("torah")
+    return _load_letter_corpus(version, tuple(books), use_cache)
@@ -0,0 +1,114 @@
+"""
+This module resolves free-text book names and version names (as typed by a user, or as generated by the LLM) into the canonical codes that the tools use.
+The aim is to fix typos and common aliases inside the tool itself, instead of failing with an error and spending another LLM step (round trip) on a retry.
+Only really ambiguous inputs are rejected, together with a short ranked list of suggestions.
+"""
+import re
+import unicodedata
+import sefaria.sefaria_code as sef
+
+# Common aliases (abbreviations, transliterations, Hebrew names) are kept in the catalog (sefaria/catalog.json). The canonical code itself is always an alias of itself.
+book_aliases = {code: info["aliases"] for (code, info) in sef.book_code2info.items()}
+version_aliases = {code: info["aliases"] for (code, info) in sef.version_code2info.items()}
+
+def normalize_name(name:str) -> str:
+    """
+    Normalize a name for matching: lowercase, drop Hebrew Nikkud/Ta'amei-Hamikra (and other combining marks),
+    and collapse punctuation/underscores/whitespace into single spaces.
+    """
+    name = unicodedata.normalize("NFD", str(name).strip().lower())
+    name = "".join([c for c in name if not unicodedata.combining(c)])
+    name = re.sub(r"[\s\.\-_,:;'\"()\[\]/]+", " ", name)
+    return name.strip()
+
+def _trigrams(norm:str) -> set[str]:
+    padded = f"  {norm} "
+    return {padded[i:i+3] for i in range(len(padded) - 2)}
+
+def edit_distance(a:str, b:str) -> int:
+    """
+    Optimal-string-alignment distance (Levenshtein distance that also counts a swap of two adjacent characters as a single edit).
+    """
+    if a == b:
+        return 0
+    prev2 = None
+    prev = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        cur = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i-1] == b[j-1] else 1
+            cur[j] = min(prev[j] + 1, cur[j-1] + 1, prev[j-1] + cost)
+            if i > 1 and j > 1 and a[i-1] == b[j-2] and a[i-2] == b[j-1]:
+                cur[j] = min(cur[j], prev2[j-2] + 1)
+        (prev2, prev) = (prev, cur)
+    return prev[len(b)]
+
+class NameResolver:
+    """
+    A precomputed index from aliases (normalized) to canonical codes.
+    Exact alias hits are resolved with a dictionary lookup. Other inputs are matched with a trigram index (to get a few candidate aliases)
+    and then scored by edit-distance similarity.
+    """
+    MIN_SCORE = 0.75 # Minimal similarity for automatically resolving an input.
+    MIN_MARGIN = 0.15 # How much better the best code has to be, compared with the second best code.
+    MIN_SUGGESTION_SCORE = 0.4
+    MAX_SUGGESTIONS = 5
+    MIN_PREFIX_LEN = 3
+
+    def __init__(self, code2aliases:dict[str, list[str]]):
+        self.codes = list(code2aliases.keys())
+        self.alias2codes = {}
+        for code, aliases in code2aliases.items():
+            for alias in [code] + list(aliases):
+                norm = normalize_name(alias)
+                self.alias2codes.setdefault(norm, set()).add(code)
+        self.trigram2aliases = {}
+        for norm in self.alias2codes:
+            for tri in _trigrams(norm):
+                self.trigram2aliases.setdefault(tri, set()).add(norm)
+
+    def _score(self, norm:str, alias:str) -> float:
+        score = 1. - edit_distance(norm, alias) / max(len(norm), len(alias))
+        if len(norm) >= self.MIN_PREFIX_LEN and alias.startswith(norm):
+            # The user typed the beginning of a name (e.g., "deuter")
+            score = max(score, 0.9)
+        return score
+
+    def rank(self, name:str) -> list[tuple[str, float]]:
+        """
+        Rank the canonical codes by similarity to the given name.
+
+        Returns:
+        - list of (code, score) tuples, best first. Score is 1.0 for an exact alias hit.
+        """
+        norm = normalize_name(name)
+        if norm in self.alias2codes:
+            return [(code, 1.) for code in sorted(self.alias2codes[norm])]
+        candidates = set()
+        for tri in _trigrams(norm):
+            candidates.update(self.trigram2aliases.get(tri, ()))
+        code2score = {}
+        for alias in candidates:
+            score = self._score(norm, alias)
+            for code in self.alias2codes[alias]:
+                if score > code2score.get(code, 0.):
+                    code2score[code] = score
+        ranked = sorted(code2score.items(), key=lambda item: (-item[1], item[0]))
+        return ranked
+
+    def resolve(self, name:str) -> tuple[str, list[tuple[str, float]]]:
+        """
+        Try to resolve a name into a single canonical code.
+
+        Returns:
+        - code (str): the resolved code, or None if the input is unknown or ambiguous.
+        - suggestions (list of (code, score) tuples): ranked candidate codes (empty when the input was resolved).
+        """
+        ranked = self.rank(name)
+        if ranked:
+            (best_code, best_score) = ranked[0]
+            second_score = ranked[1][1] if len(ranked) > 1 else 0.
+            if best_score >= self.MIN_SCORE and (best_score - second_score) >= self.MIN_MARGIN:
+                return (best_code, [])
+        suggestions = [(code, score) for (code, score) in ranked if score >= self.MIN_SUGGESTION_SCORE]
+        return (None, suggestions[:self.MAX_SUGGESTIONS])
@@ -0,0 +1,139 @@
+"""
+This module is a deterministic fast-path router that runs before the LLM.
+Many user requests are explicit, e.g., "Genesis 1:1 in JPS 1917", "בראשית א:א בתרגום koren" or "search for ערום".
+For such requests the LLM only copies the reference into a tool call and then copies the tool's result back to the user (two full LLM calls).
+The router parses these requests with a compiled grammar (regular expressions), and tells the agent which tool calls to make.
+The agent then writes the same (synthetic) assistant/tool messages the LLM would have produced, so the conversation history stays consistent.
+Anything that doesn't fully match the grammar, or is ambiguous (e.g., no version mentioned, or an unclear book name), falls through to the LLM.
+"""
+import re
+from . import bible_tools as bblt
+
+HEBREW_NUMERALS = {
+    'א': 1, 'ב': 2, 'ג': 3, 'ד': 4, 'ה': 5, 'ו': 6, 'ז': 7, 'ח': 8, 'ט': 9,
+    'י': 10, 'כ': 20, 'ך': 20, 'ל': 30, 'מ': 40, 'ם': 40, 'נ': 50, 'ן': 50, 'ס': 60, 'ע': 70, 'פ': 80, 'ף': 80, 'צ': 90, 'ץ': 90,
+    'ק': 100, 'ר': 200, 'ש': 300, 'ת': 400
+}
+
+def parse_number(num_str:str) -> int:
+    """
+    Parse a chapter/verse number, given either in digits ("15") or as a Hebrew numeral ("טו", "ט״ו", "קנ").
+    Returns None if it isn't a valid number.
+    """
+    num_str = num_str.strip()
+    if num_str.isdigit():
+        return int(num_str)
+    letters = re.sub(r"[\"'׳״]", "", num_str)
+    if (not letters) or any([letter not in HEBREW_NUMERALS for letter in letters]):
+        return None
+    values = [HEBREW_NUMERALS[letter] for letter in letters]
+    if values != sorted(values, reverse=True):
+        return None # Hebrew numerals are written from the largest value to the smallest
+    return sum(values)
+
+_HEB = "א-ת"
+_NUM = rf"(?:\d{{1,3}}|[{_HEB}]{{1,3}}(?:[\"'׳״][{_HEB}])?)"
+_LEAD = r"(?:(?:please|pls|can you|could you)\s+)?(?:(?:get|give|show|read|quote|fetch|print|tell|what is|what's)(?:\s+me)?\s+)?(?:the\s+)?(?:text\s+of\s+)?(?:verse\s+)?(?:הבא\s+לי\s+|תן\s+לי\s+|הצג\s+)?(?:את\s+)?(?:הפסוק\s+)?"
+_REF = rf"(?P<book>[^\d:]+?)\s*,?\s+(?P<chapter>{_NUM})\s*[:.]\s*(?P<verse>{_NUM})(?:\s*[-–]\s*(?P<verse_end>{_NUM}))?"
+_VERSION = r"(?:\s*(?:,|\(|\bin\b|\bfrom\b|\baccording to\b|\bversion\b|בגרסת|בגרסה|בתרגום|בנוסח|לפי)\s*(?:the\s+)?(?P<version>[^()]+?)\s*(?:\bversion\b|\btranslation\b)?\s*\)?)"
+_END = r"\s*[.?!]*\s*$"
+
+LOOKUP_GRAMMAR = re.compile(rf"^\s*{_LEAD}{_REF}{_VERSION}?{_END}", re.IGNORECASE)
+
+_PHRASE = rf"[\"'“”]?(?P<phrase>[{_HEB}]+(?:\s+[{_HEB}]+)*)[\"'“”]?"
+SEARCH_GRAMMAR = re.compile(
+    rf"^\s*(?:(?:please\s+)?(?:search|find|look\s+for|locate)(?:\s+the\s+bible)?(?:\s+for)?(?:\s+all)?(?:\s+the)?(?:\s+(?:verses|occurrences|places)\s+(?:with|of|that\s+(?:have|contain)))?(?:\s+the)?(?:\s+(?:word|phrase))?"
+    rf"|(?:חפש|חפשי|מצא|מצאי)(?:\s+את)?(?:\s+(?:כל\s+)?(?:ה?פסוקים|ה?מקומות)\s+עם)?(?:\s+(?:ה?מילה|ה?ביטוי))?)"
+    rf"\s+{_PHRASE}{_END}", re.IGNORECASE)
+
+class Router:
+    """
+    Parses explicit requests into tool calls, and keeps hit-rate and latency statistics.
+    """
+    MAX_VERSES_PER_RANGE = 10
+    MIN_SEARCH_PHRASE_LEN = 3 # The search tool doesn't support very short phrases
+    SEARCH_N_MAX_RESULTS = 10 # The search tool's default n_max_results: getting this many results means there may be more
+
+    def __init__(self, lookup_tool_name:str, search_tool_name:str):
+        self.lookup_tool_name = lookup_tool_name
+        self.search_tool_name = search_tool_name
+        self.n_routed = 0
+        self.n_fell_through = 0
+        self.n_tool_errors = 0 # Routed, but a tool failed, so the LLM took over
+        self.routed_latency = 0.
+        self.fell_through_latency = 0.
+
+    def parse(self, user_message:str) -> list[tuple[str, dict]]:
+        """
+        Parse a user message.
+
+        Returns:
+        - list of (tool_name, tool_args) tuples: the tool calls that fulfill the request, or None if the message should go to the LLM.
+        """
+        match = LOOKUP_GRAMMAR.match(user_message)
+        if match:
+            return self._parse_lookup(match)
+        match = SEARCH_GRAMMAR.match(user_message)
+        if match:
+            phrase = ' '.join(match.group('phrase').split())
+            if len(phrase) < self.MIN_SEARCH_PHRASE_LEN:
+                return None
+            return [(self.search_tool_name, {"phrase": phrase})]
+        return None
+
+    def _parse_lookup(self, match:re.Match) -> list[tuple[str, dict]]:
+        if not match.group('version'):
+            return None # Never guess a missing version
+        (book, book_suggestions) = bblt.book_resolver.resolve(match.group('book'))
+        (version, version_suggestions) = bblt.version_resolver.resolve(match.group('version'))
+        if (book not in bblt.supported_books) or (version not in bblt.supported_versions):
+            return None # Unknown, ambiguous or unsupported: the LLM explains that to the user
+        chapter_num = parse_number(match.group('chapter'))
+        verse_num = parse_number(match.group('verse'))
+        verse_end = parse_number(match.group('verse_end')) if match.group('verse_end') else verse_num
+        if (not chapter_num) or (not verse_num) or (not verse_end):
+            return None
+        if (verse_end < verse_num) or (verse_end - verse_num >= self.MAX_VERSES_PER_RANGE):
+            return None
+        return [(self.lookup_tool_name, {"version": version, "book": book, "chapter_num": chapter_num, "verse_num": v}) for v in range(verse_num, verse_end + 1)]
+
+    def compose_response(self, tool_calls:list[tuple[str, dict]], results:list[dict]) -> str:
+        """
+        Compose the text for the user, from the results of successful tool calls (the way the LLM was trained to respond).
+        """
+        (tool_name, tool_args) = tool_calls[0]
+        if tool_name == self.search_tool_name:
+            n_found = len(results[0]["results"])
+            if n_found >= self.SEARCH_N_MAX_RESULTS:
+                return f"O.K. Here are the first {n_found} verses I found with the phrase '{tool_args['phrase']}'. Now what?"
+            return f"O.K. I found {n_found} verses with the phrase '{tool_args['phrase']}'. Now what?"
+        if len(results) == 1:
+            return results[0]["text"]
+        return '\n'.join([f"{res['chapter_num']}:{res['verse_num']} {res['text']}" for res in results])
+
+    def record(self, routed:bool, latency:float, tool_error:bool=False):
+        if routed:
+            self.n_routed += 1
+            self.routed_latency += latency
+        else:
+            self.n_fell_through += 1
+            self.fell_through_latency += latency
+            if tool_error:
+                self.n_tool_errors += 1
+
+    def stats(self) -> dict:
+        """
+        Returns:
+        - dictionary with the number of routed / fell-through user messages, the hit rate,
+          and the mean latency (seconds) of a routed turn (including the tool calls) and of a miss (the parsing overhead before calling the LLM).
+        """
+        n_total = self.n_routed + self.n_fell_through
+        return {
+            "n_messages": n_total,
+            "n_routed": self.n_routed,
+            "n_fell_through": self.n_fell_through,
+            "n_tool_errors": self.n_tool_errors,
+            "hit_rate": (self.n_routed / n_total) if n_total else None,
+            "mean_routed_latency": (self.routed_latency / self.n_routed) if self.n_routed else None,
+            "mean_miss_latency": (self.fell_through_latency / self.n_fell_through) if self.n_fell_through else None
+        }
@@ -0,0 +1,258 @@
+"""
+This module serves many agent sessions at once (e.g., several researchers sharing one ollama host).
+Each session is its own Agent (with its own conversation history), while all sessions share the same process - so they also share the corpus cache of the tools.
+Calls to the LLM are limited by a global semaphore (the rest wait in a queue), and blocking LLM/tool calls run in a thread pool.
+
+A lightweight local HTTP entry point:
+    python -m bibleAssistant.service --model gemma3:1b-2t1-426 --port 8765
+For load testing on a single machine, without ollama:
+    python -m bibleAssistant.service --fake-llm --fake-latency 0.5 --max-llm-calls 2
+    python -m bibleAssistant.service --load-test http://127.0.0.1:8765 --n-sessions 20 --n-turns 3
+
+HTTP API (JSON bodies and responses):
+- POST   /sessions                 -> {"session_id": ...}
+- POST   /sessions/<session_id>/ask  with body {"message": ...} -> {"session_id": ..., "response": ...}
+- DELETE /sessions/<session_id>    -> {"session_id": ..., "deleted": true}
+- GET    /health                   -> service stats
+"""
+import json
+import time
+import uuid
+import asyncio
+import argparse
+import urllib.parse
+import concurrent.futures
+
+from . import agent
+
+class FakeLLM:
+    """
+    A fake LLM backend (same call signature as ollama.chat) for load testing the service without a real model.
+    It waits latency seconds (like a model generating a response) and then responds to the user with an echo of the last message.
+    """
+    def __init__(self, latency:float=0.2):
+        self.latency = latency
+
+    def __call__(self, model=None, messages=None, **kwargs) -> dict:
+        time.sleep(self.latency)
+        text = f"echo: {messages[-1]['content']}"
+        content = json.dumps({agent.Agent.KEY_TOOL: agent.Agent.TOOL_RESPOND_TO_USER, agent.Agent.KEY_ARGS: {agent.Agent.SUBKEY_TEXT: text}}, ensure_ascii=False)
+        return {"message": {"role": agent.Agent.ROLE_ASSISTANT, "content": content}}
+
+class LLMSlots:
+    """
+    The global limit on concurrent LLM calls: a semaphore that also counts the calls currently holding it (the rest wait in a queue).
+    Used as the llm_semaphore of Agent.ask_async (an async context manager, like asyncio.Semaphore).
+    """
+    def __init__(self, n_slots:int):
+        self.semaphore = asyncio.Semaphore(n_slots)
+        self.n_in_flight = 0
+
+    async def __aenter__(self):
+        await self.semaphore.acquire()
+        self.n_in_flight += 1
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.n_in_flight -= 1
+        self.semaphore.release()
+
+class AgentService:
+    """
+    Holds many agent sessions, and answers their requests concurrently (asyncio).
+    """
+    def __init__(self, model_name:str, max_concurrent_llm_calls:int=1, max_workers:int=8, keep_alive:str|float=None, chat_func=None, use_router:bool=False, verbose:bool=False):
+        """
+        model_name: the ollama model that drives all the sessions.
+        max_concurrent_llm_calls: global limit of LLM calls in flight (across all sessions). Additional calls wait in a queue.
+        max_workers: size of the thread pool that runs the blocking LLM calls and tool calls.
+        keep_alive, chat_func, use_router: passed to every Agent (see Agent.__init__).
+        """
+        self.model_name = model_name
+        self.max_concurrent_llm_calls = max_concurrent_llm_calls
+        self.keep_alive = keep_alive
+        self.chat_func = chat_func
+        self.use_router = use_router
+        self.verbose = verbose
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+        self.llm_semaphore = None # Created lazily, inside the running event loop
+        self.sessions = {}
+        self.session_locks = {}
+        self.n_requests = 0
+        self.n_active_requests = 0
+        self.total_latency = 0.
+
+    def create_session(self) -> str:
+        session_id = uuid.uuid4().hex
+        self.sessions[session_id] = agent.Agent(self.model_name, verbose=self.verbose, keep_alive=self.keep_alive, chat_func=self.chat_func, use_router=self.use_router)
+        self.session_locks[session_id] = asyncio.Lock()
+        return session_id
+
+    def close_session(self, session_id:str):
+        if session_id not in self.sessions:
+            raise KeyError(f"No session with id '{session_id}'")
+        del self.sessions[session_id]
+        del self.session_locks[session_id]
+
+    async def ask(self, session_id:str, user_message:str) -> str:
+        """
+        Pass a user message to the agent of the session and return the agent's response.
+        Requests of the same session are handled one at a time (in order), while different sessions run concurrently.
+        """
+        if session_id not in self.sessions:
+            raise KeyError(f"No session with id '{session_id}'")
+        if self.llm_semaphore is None:
+            self.llm_semaphore = LLMSlots(self.max_concurrent_llm_calls)
+        start = time.perf_counter()
+        self.n_active_requests += 1
+        try:
+            async with self.session_locks[session_id]:
+                return await self.sessions[session_id].ask_async(user_message, llm_semaphore=self.llm_semaphore, executor=self.executor)
+        finally:
+            self.n_active_requests -= 1
+            self.n_requests += 1
+            self.total_latency += time.perf_counter() - start
+
+    def stats(self) -> dict:
+        return {
+            "model_name": self.model_name,
+            "n_sessions": len(self.sessions),
+            "n_active_requests": self.n_active_requests,
+            "n_llm_calls_in_flight": self.llm_semaphore.n_in_flight if self.llm_semaphore else 0,
+            "max_concurrent_llm_calls": self.max_concurrent_llm_calls,
+            "n_requests": self.n_requests,
+            "mean_latency": (self.total_latency / self.n_requests) if self.n_requests else None
+        }
+
+    async def handle_http_request(self, method:str, path:str, body:dict) -> tuple[int, dict]:
+        """
+        Route a (parsed) HTTP request. Returns the HTTP status code and a JSON-able response.
+        """
+        parts = [part for part in urllib.parse.urlparse(path).path.split('/') if part]
+        try:
+            if method == "GET" and parts == ["health"]:
+                return (200, self.stats())
+            if method == "POST" and parts == ["sessions"]:
+                return (200, {"session_id": self.create_session()})
+            if method == "POST" and len(parts) == 3 and parts[0] == "sessions" and parts[2] == "ask":
+                message = body.get("message")
+                if not isinstance(message, str):
+                    return (400, {"error_message": "Expecting a JSON body with a string field 'message'"})
+                response = await self.ask(parts[1], message)
+                return (200, {"session_id": parts[1], "response": response})
+            if method == "DELETE" and len(parts) == 2 and parts[0] == "sessions":
+                self.close_session(parts[1])
+                return (200, {"session_id": parts[1], "deleted": True})
+        except KeyError as ex:
+            return (404, {"error_message": ex.args[0]})
+        except Exception as ex:
+            return (500, {"error_message": str(ex)})
+        return (404, {"error_message": f"Unsupported request {method} {path}"})
+
+    async def _handle_connection(self, reader:asyncio.StreamReader, writer:asyncio.StreamWriter):
+        try:
+            request_line = (await reader.readline()).decode('latin-1').strip()
+            headers = {}
+            while True:
+                line = (await reader.readline()).decode('latin-1').strip()
+                if not line:
+                    break
+                (key, _, val) = line.partition(':')
+                headers[key.strip().lower()] = val.strip()
+            (method, path, _) = request_line.split(' ', 2)
+            n_bytes = int(headers.get('content-length', 0))
+            raw_body = (await reader.readexactly(n_bytes)) if n_bytes else b''
+            try:
+                body = json.loads(raw_body) if raw_body else {}
+                (status, response) = await self.handle_http_request(method, path, body)
+            except json.JSONDecodeError:
+                (status, response) = (400, {"error_message": "Request body is not a valid JSON"})
+            payload = json.dumps(response, ensure_ascii=False).encode('utf-8')
+            reason = {200: "OK", 400: "Bad Request", 404: "Not Found"}.get(status, "Internal Server Error")
+            header = f"HTTP/1.1 {status} {reason}\r\nContent-Type: application/json; charset=utf-8\r\nContent-Length: {len(payload)}\r\nConnection: close\r\n\r\n"
+            writer.write(header.encode('latin-1') + payload)
+            await writer.drain()
+        except (ValueError, ConnectionError, asyncio.IncompleteReadError) as ex:
+            if self.verbose:
+                print(f"!!! Dropped a malformed request: {ex}")
+        finally:
+            writer.close()
+
+    async def serve(self, host:str="127.0.0.1", port:int=8765):
+        server = await asyncio.start_server(self._handle_connection, host, port)
+        print(f"Agent service (model {self.model_name}) listening on http://{host}:{port}")
+        async with server:
+            await server.serve_forever()
+
+async def http_request(url:str, method:str="GET", body:dict=None) -> tuple[int, dict]:
+    """
+    A minimal asyncio HTTP client for talking to the service (used for load testing, without extra dependencies).
+    """
+    parsed = urllib.parse.urlparse(url)
+    (reader, writer) = await asyncio.open_connection(parsed.hostname, parsed.port or 80)
+    payload = json.dumps(body, ensure_ascii=False).encode('utf-8') if body is not None else b''
+    header = f"{method} {parsed.path or '/'} HTTP/1.1\r\nHost: {parsed.netloc}\r\nContent-Type: application/json\r\nContent-Length: {len(payload)}\r\nConnection: close\r\n\r\n"
+    writer.write(header.encode('latin-1') + payload)
+    await writer.drain()
+    raw = await reader.read()
+    writer.close()
+    (head, _, raw_body) = raw.partition(b'\r\n\r\n')
+    status = int(head.split(b' ', 2)[1])
+    return (status, json.loads(raw_body))
+
+async def load_test(base_url:str, n_sessions:int=10, n_turns:int=3) -> dict:
+    """
+    Open n_sessions concurrent sessions, each sending n_turns consecutive messages, and measure the request latencies.
+    """
+    async def run_session(session_num):
+        (_, resp) = await http_request(f"{base_url}/sessions", method="POST")
+        session_id = resp["session_id"]
+        latencies = []
+        for turn in range(n_turns):
+            start = time.perf_counter()
+            (status, resp) = await http_request(f"{base_url}/sessions/{session_id}/ask", method="POST", body={"message": f"session {session_num} turn {turn}"})
+            if status != 200:
+                raise ValueError(f"Request failed with status {status}: {resp}")
+            latencies.append(time.perf_counter() - start)
+        await http_request(f"{base_url}/sessions/{session_id}", method="DELETE")
+        return latencies
+
+    start = time.perf_counter()
+    session_latencies = await asyncio.gather(*[run_session(i) for i in range(n_sessions)])
+    total_time = time.perf_counter() - start
+    latencies = sorted([lat for session_lats in session_latencies for lat in session_lats])
+    results = {
+        "n_requests": len(latencies),
+        "total_time": total_time,
+        "requests_per_sec": len(latencies) / total_time,
+        "mean_latency": sum(latencies) / len(latencies),
+        "median_latency": latencies[len(latencies) // 2],
+        "max_latency": latencies[-1]
+    }
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve many agent sessions over a local HTTP entry point.")
+    parser.add_argument("--model", default="gemma3:1b", help="ollama model name")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--max-llm-calls", type=int, default=1, help="global limit of concurrent LLM calls")
+    parser.add_argument("--max-workers", type=int, default=8, help="thread pool size for blocking LLM/tool calls")
+    parser.add_argument("--keep-alive", default=None, help="how long ollama keeps the model loaded (e.g., 30m)")
+    parser.add_argument("--router", action="store_true", help="handle explicit requests with the deterministic router (without the LLM)")
+    parser.add_argument("--fake-llm", action="store_true", help="use a fake LLM backend (for load testing without ollama)")
+    parser.add_argument("--fake-latency", type=float, default=0.2, help="seconds per fake LLM call")
+    parser.add_argument("--load-test", metavar="URL", default=None, help="instead of serving, run a load test against a running service")
+    parser.add_argument("--n-sessions", type=int, default=10)
+    parser.add_argument("--n-turns", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    if args.load_test:
+        results = asyncio.run(load_test(args.load_test.rstrip('/'), n_sessions=args.n_sessions, n_turns=args.n_turns))
+        print(json.dumps(results, indent=2))
+        return
+    chat_func = FakeLLM(latency=args.fake_latency) if args.fake_llm else None
+    service = AgentService(args.model, max_concurrent_llm_calls=args.max_llm_calls, max_workers=args.max_workers, keep_alive=args.keep_alive, chat_func=chat_func, use_router=args.router)
+    asyncio.run(service.serve(host=args.host, port=args.port))
+
+if __name__ == "__main__":
+    main()
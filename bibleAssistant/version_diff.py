@@ -0,0 +1,169 @@
+"""
+This module compares two versions of the same book (e.g., EN_JSP_1917 vs EN_JSP_2006, or HE_MASORAH vs HE_TEXT_ONLY) word by word.
+For every verse it computes a word-level alignment (edit script) and a similarity score, so we can ask questions like
+"in which verses do the two translations differ the most?" without eyeballing two full texts.
+
+Book diffs are computed in parallel (one task per chapter) and cached on disk (as JSON),
+in the folder BIBLE_CACHE_DIR (environment variable), or by default in a "cache" subfolder of SEFARIA_DATA_DIR.
+A cached diff is recomputed if one of the two source files changed.
+"""
+import os
+import json
+import string
+import difflib
+import functools
+import sefaria.sefaria_code as sef
+from . import corpus_search
+
+_PUNCTUATION = string.punctuation + "“”‘’—–׃׀"
+# Bump when the normalization or the diff format changes, so older cached diffs are recomputed:
+CACHE_FORMAT = 2
+
+def split_words(text:str, normalize:bool=True) -> list[str]:
+    """
+    Split a (prepared) verse into words. When normalizing, punctuation at the edges of words is ignored (so "earth." and "earth" are the same word).
+    """
+    if not normalize:
+        return text.split()
+    words = [word.strip(_PUNCTUATION) for word in text.split()]
+    return [word for word in words if word]
+
+def cache_dir() -> str:
+    folder = os.environ.get("BIBLE_CACHE_DIR") or os.path.join(os.environ["SEFARIA_DATA_DIR"], "cache")
+    os.makedirs(folder, exist_ok=True)
+    return folder
+
+def diff_words(words_a:list[str], words_b:list[str]) -> tuple[float, list[list]]:
+    """
+    Align two sequences of words.
+
+    Returns:
+    - similarity (float): between 0 (nothing in common) and 1 (identical).
+    - ops (list of [tag, words_a, words_b]): the edit script (only the differences), where tag is "replace", "delete" (words only in a) or "insert" (words only in b).
+    """
+    matcher = difflib.SequenceMatcher(None, words_a, words_b, autojunk=False)
+    ops = []
+    for (tag, i1, i2, j1, j2) in matcher.get_opcodes():
+        if tag != "equal":
+            ops.append([tag, " ".join(words_a[i1:i2]), " ".join(words_b[j1:j2])])
+    return (matcher.ratio(), ops)
+
+def diff_verse(text_a:str, text_b:str, normalize:bool=True) -> dict:
+    """
+    Compare two versions of a verse, word by word.
+    If normalize is True, compare the normalized texts (no HTML, no Nikkud/Ta'amei-Hamikra, lowercase, no punctuation), otherwise compare the texts as they are (only without HTML).
+
+    Returns:
+    - dictionary with fields similarity (float) and ops (the edit script, see diff_words).
+    """
+    prep = corpus_search.normalize_verse if normalize else corpus_search.strip_html
+    (similarity, ops) = diff_words(split_words(prep(text_a), normalize), split_words(prep(text_b), normalize))
+    return {"similarity": similarity, "ops": ops}
+
+def diff_chapter(book:str, version_a:str, version_b:str, chapter_num:int, normalize:bool=True) -> list[dict]:
+    """
+    Compare all the verses of a chapter. This runs inside the worker processes.
+    A verse that exists in only one of the versions gets similarity 0.
+
+    Returns:
+    - list of dictionaries with fields chapter_num, verse_num, similarity and ops.
+    """
+    verses_a = _chapter2verses(book, version_a, normalize).get(chapter_num, {})
+    verses_b = _chapter2verses(book, version_b, normalize).get(chapter_num, {})
+    diffs = []
+    for verse_num in sorted(set(verses_a) | set(verses_b)):
+        words_a = split_words(verses_a.get(verse_num, ""), normalize)
+        words_b = split_words(verses_b.get(verse_num, ""), normalize)
+        if words_a and words_b:
+            (similarity, ops) = diff_words(words_a, words_b)
+        else:
+            (similarity, ops) = (float(words_a == words_b), diff_words(words_a, words_b)[1])
+        diffs.append({"chapter_num": chapter_num, "verse_num": verse_num, "similarity": similarity, "ops": ops})
+    return diffs
+
+@functools.lru_cache(maxsize=None)
+def _chapter2verses(book:str, version:str, normalize:bool) -> dict[int, dict[int, str]]:
+    (refs, texts, norm_texts) = corpus_search.load_normalized_verses(book, version)
+    chapter2verses = {}
+    for ((c, v), text) in zip(refs, norm_texts if normalize else texts):
+        chapter2verses.setdefault(c, {})[v] = text
+    return chapter2verses
+
+def _n_chapters(book:str, version:str) -> int:
+    return max(_chapter2verses(book, version, True).keys(), default=0)
+
+def _source_stamps(book:str, version_a:str, version_b:str) -> dict:
+    stamps = {}
+    for version in [version_a, version_b]:
+        local = sef.sefaria_local(book, version)
+        if not os.path.exists(local):
+            raise ValueError(f"Missing local file for book '{book}' in version '{version}': {local}")
+        stamps[version] = os.path.getmtime(local)
+    return stamps
+
+def diff_book(book:str, version_a:str, version_b:str, normalize:bool=True, use_cache:bool=True, n_workers:int=None) -> list[dict]:
+    """
+    Compare two versions of a whole book, verse by verse (see diff_chapter). Chapters are compared in parallel, and the result is cached on disk.
+
+    Args:
+    - book (str): book code.
+    - version_a, version_b (str): version codes.
+    - normalize (bool): compare normalized texts (see diff_verse).
+    - use_cache (bool): read/write the disk cache.
+    - n_workers (int): number of worker processes. Default: number of cores. 1 means computing in this process.
+
+    Returns:
+    - list of verse diffs (dictionaries with fields chapter_num, verse_num, similarity and ops), in book order.
+    """
+    stamps = _source_stamps(book, version_a, version_b)
+    cache_file = os.path.join(cache_dir(), f"diff.{book}.{version_a}.{version_b}.{'norm' if normalize else 'raw'}.json")
+    if use_cache and os.path.exists(cache_file):
+        try:
+            with open(cache_file, 'r', encoding='utf-8') as f:
+                cached = json.load(f)
+        except json.JSONDecodeError:
+            cached = {} # A corrupt cache file is just a cache miss (it is overwritten below)
+        if (cached.get("format") == CACHE_FORMAT) and (cached.get("sources") == stamps):
+            return cached["verses"]
+
+    n_chapters = max(_n_chapters(book, version_a), _n_chapters(book, version_b))
+    chapter_nums = list(range(1, n_chapters + 1))
+    n_workers = n_workers or os.cpu_count() or 1
+    if n_workers == 1:
+        chapter_diffs = [diff_chapter(book, version_a, version_b, c, normalize) for c in chapter_nums]
+    else:
+        executor = corpus_search.get_process_pool(n_workers)
+        chapter_diffs = list(executor.map(diff_chapter, *zip(*[(book, version_a, version_b, c, normalize) for c in chapter_nums])))
+    verses = [verse_diff for chapter in chapter_diffs for verse_diff in chapter]
+
+    if use_cache:
+        # Write to a temporary file and then rename it, so an interrupted write never leaves a truncated cache file:
+        tmp_file = f"{cache_file}.{os.getpid()}.tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump({"format": CACHE_FORMAT, "book": book, "version_a": version_a, "version_b": version_b, "normalize": normalize, "sources": stamps, "verses": verses}, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(tmp_file, cache_file)
+    return verses
+
+def most_different_verses(book:str, version_a:str, version_b:str, n:int=10, normalize:bool=True, chapter_num:int=None) -> list[dict]:
+    """
+    The n verses where the two versions differ the most (lowest similarity first), optionally only in one chapter.
+    """
+    verses = diff_book(book, version_a, version_b, normalize=normalize)
+    if chapter_num:
+        verses = [verse for verse in verses if verse["chapter_num"] == chapter_num]
+    return sorted(verses, key=lambda verse: verse["similarity"])[:n]
+
+def book_similarity_summary(book:str, version_a:str, version_b:str, normalize:bool=True) -> dict:
+    """
+    Summary statistics of a book diff: number of verses, how many are identical, mean similarity, and the mean similarity per chapter.
+    """
+    verses = diff_book(book, version_a, version_b, normalize=normalize)
+    chapter2sims = {}
+    for verse in verses:
+        chapter2sims.setdefault(verse["chapter_num"], []).append(verse["similarity"])
+    return {
+        "n_verses": len(verses),
+        "n_identical": sum([1 for verse in verses if not verse["ops"]]),
+        "mean_similarity": (sum([verse["similarity"] for verse in verses]) / len(verses)) if verses else None,
+        "chapter_mean_similarity": {c: sum(sims) / len(sims) for (c, sims) in chapter2sims.items()}
+    }
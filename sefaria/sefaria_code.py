@@ -1,69 +1,38 @@
-import requests
 import json
 import os
-import ipynbname
-import pandas as pd
-from bs4 import BeautifulSoup
+# Heavy libraries (requests, pandas, bs4) are imported lazily inside the functions that need them, to keep importing this module fast.
+
+# The books and versions are data, not code: sefaria/catalog.json lists all the books of the Tanakh and all the known versions
+# (codes, paths in Sefaria-Export, names, descriptions and aliases). The constants and lookup tables below are generated from it.
+CATALOG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "catalog.json")
+with open(CATALOG_FILE, 'r', encoding='utf-8') as _f:
+    catalog = json.load(_f)
 
 class BookCode:
-    GENESIS = "genesis"
-    EXODUS = "exodus"
-    LEVITICUS = "leviticus"
-    NUMBERS = "numbers"
-    DEUTERONOMY = "deuteronomy"
-    ISAIAH = "isaiah"
-    JEREMIAH = "jeremiah"
-
-book_code2web = {
-    BookCode.GENESIS: 'Tanakh/Torah/Genesis',
-    BookCode.EXODUS: 'Tanakh/Torah/Exodus',
-    BookCode.LEVITICUS: 'Tanakh/Torah/Leviticus',
-    BookCode.NUMBERS: 'Tanakh/Torah/Numbers',
-    BookCode.DEUTERONOMY: 'Tanakh/Torah/Deuteronomy',
-    BookCode.ISAIAH: 'Tanakh/Prophets/Isaiah',
-    BookCode.JEREMIAH: 'Tanakh/Prophets/Jeremiah'
-}
+    pass # Constants are set from the catalog, e.g. BookCode.GENESIS = "genesis"
 
 class VersionCode:
-    HE_TEXT_ONLY = "he.text_only"
-    HE_MASORAH = "he.masorah"
-    HE_TAAMEI = "he.taamei"
-    HE_NIKKUD = "he.nikkud"
-    EN_JEWISH = "en.jewish"
-    EN_ADAM_COHN = "en.modern.adam_cohn"
-    EN_JSP_1917 = "en.new.jps1917"
-    EN_JSP_2006 = "en.contemp.jps2006"
-    EN_KOREN = "en.koren"
-    FR_RABBINAT_1899 = "fr.rabbinat1899"
-    FR_SAMUEL_CAHEN_1831 = "fr.samuel_cahen1831"
-
-version_code2web = {
-    VersionCode.HE_TEXT_ONLY: 'Hebrew/Tanach%20with%20Text%20Only',
-    VersionCode.HE_MASORAH: 'Hebrew/Miqra%20according%20to%20the%20Masorah',
-    VersionCode.HE_TAAMEI: "Hebrew/Tanach%20with%20Ta'amei%20Hamikra",
-    VersionCode.HE_NIKKUD: 'Hebrew/Tanach%20with%20Nikkud',
-    VersionCode.EN_JEWISH: 'English/Jewish%20English%20Torah',
-    VersionCode.EN_ADAM_COHN: 'English/Modernized%20Tanakh%20-%20Based%20on%20JPS%201917%2C%20Edited%20by%20Adam%20Cohn',
-    VersionCode.EN_JSP_1917: 'English/The%20Holy%20Scriptures%20A%20New%20Translation%20JPS%201917',
-    VersionCode.EN_JSP_2006: 'English/The%20Contemporary%20Torah%2C%20Jewish%20Publication%20Society%2C%202006',
-    VersionCode.EN_KOREN: 'English/The%20Koren%20Jerusalem%20Bible',
-    VersionCode.FR_RABBINAT_1899: 'English/Bible du Rabbinat 1899 [fr]',
-    VersionCode.FR_SAMUEL_CAHEN_1831: 'English/La Bible, Traduction Nouvelle, Samuel Cahen, 1831 [fr]'
-}
-
-version_code2name = {
-    VersionCode.HE_TEXT_ONLY: 'Hebrew (text only)',
-    VersionCode.HE_MASORAH: 'Hebrew (Miqra according to the Masorah)',
-    VersionCode.HE_TAAMEI: "Hebrew (with Ta'amei Hamikra)",
-    VersionCode.HE_NIKKUD: 'Hebrew (with Nikkud)',
-    VersionCode.EN_JEWISH: 'Jewish English Torah',
-    VersionCode.EN_ADAM_COHN: 'Modernized Tanakh - Based on JPS 1917, Edited by Adam Cohn',
-    VersionCode.EN_JSP_1917: 'The Holy Scriptures A New Translation JPS 1917',
-    VersionCode.EN_JSP_2006: 'The Contemporary Torah, Jewish Publication Society, 2006',
-    VersionCode.EN_KOREN: 'The Koren Jerusalem Bible',
-    VersionCode.FR_RABBINAT_1899: 'Bible du Rabbinat 1899 [French]',
-    VersionCode.FR_SAMUEL_CAHEN_1831: 'La Bible, Traduction Nouvelle, Samuel Cahen, 1831 [fr]'
-}
+    pass # Constants are set from the catalog, e.g. VersionCode.HE_TEXT_ONLY = "he.text_only"
+
+for _book in catalog["books"]:
+    setattr(BookCode, _book["const"], _book["code"])
+for _version in catalog["versions"]:
+    setattr(VersionCode, _version["const"], _version["code"])
+
+book_code2info = {book["code"]: book for book in catalog["books"]}
+version_code2info = {version["code"]: version for version in catalog["versions"]}
+
+book_code2web = {code: info["web"] for (code, info) in book_code2info.items()}
+book_code2name = {code: info["name"] for (code, info) in book_code2info.items()}
+book_code2hebrew = {code: info["hebrew_name"] for (code, info) in book_code2info.items()}
+version_code2web = {code: info["web"] for (code, info) in version_code2info.items()}
+version_code2name = {code: info["name"] for (code, info) in version_code2info.items()}
+
+def books_in_section(section):
+    """
+    The book codes of a section of the Tanakh ("torah", "prophets" or "writings"), in order.
+    """
+    return [code for (code, info) in book_code2info.items() if info["section"] == section]
 
 def version_code2metadata(code, use_short_desc=True):
     """
@@ -72,43 +41,11 @@ def version_code2metadata(code, use_short_desc=True):
     desc: Description of what is special about this version (1-2 sentences)
     exam: Example verse written in that particual version
     """
-    version_name = version_code2name[code]
-    if code == VersionCode.HE_TEXT_ONLY:
-        full_desc = "This is the Hebrew Bible text in the original Hebrew langauge with only the letters, but without the Nikkud markings or Ta'amei-Hamikra markings (trop)."
-        short_desc = "Hebrew language, only letters."
-        exam = "בראשית ברא אלהים את השמים ואת הארץ"
-    elif code == VersionCode.HE_MASORAH:
-        full_desc = "This is the Hebrew Bible text in the original Hebrew language according to the Masorah (the traditional script passed from generation to generation). This script has more than letters; it includes Nikkud and other markings as printed in Torah books."
-        short_desc = "Hebrew language, traditional script version (full markings)."
-        exam = "בְּרֵאשִׁ֖ית בָּרָ֣א אֱלֹהִ֑ים אֵ֥ת הַשָּׁמַ֖יִם וְאֵ֥ת הָאָֽרֶץ׃"
-    elif code == VersionCode.HE_NIKKUD:
-        full_desc = "This is the Hebrew Bible text in the original Hebrew language, with only the letters and the Nikkud (the vowel markings)."
-        short_desc = "Hebrew language, with Nikkud (vowel symbols)."
-        exam = "בְּרֵאשִׁית בָּרָא אֱלֹהִים אֵת הַשָּׁמַיִם וְאֵת הָאָרֶץ׃"
-    elif code == VersionCode.HE_TAAMEI:
-        full_desc = "This is the Hebrew Bible text in the original Hebrew language, with Ta'amei Hamikra (special markings that indicate the melodic way to sing the text - also known as cantillation or trop signs)."
-        short_desc = "Hebrew langauge, with cantillation (trop) signs."
-        exam = "בְּרֵאשִׁ֖ית בָּרָ֣א אֱלֹהִ֑ים אֵ֥ת הַשָּׁמַ֖יִם וְאֵ֥ת הָאָֽרֶץ׃"
-    elif code == VersionCode.EN_JSP_1917:
-        full_desc = "This is a translation of the Bible to Modern English, done by the Jewish Publication Society in 1917."
-        short_desc = "English language, JPS."
-        exam = "In the beginning God created the heaven and the earth."
-    elif code == VersionCode.EN_KOREN:
-        full_desc = "This is a translation to English by Koren."
-        short_desc = "English language, Koren."
-        exam = "IN THE BEGINNING God created the heaven and the earth."
-    elif code == VersionCode.FR_RABBINAT_1899:
-        full_desc = "This is a translation to French, from 1899."
-        short_desc = "French language, 1899."
-        exam = "Au commencement, Dieu créa le ciel et la terre."
-    elif code == VersionCode.FR_SAMUEL_CAHEN_1831:
-        full_desc = "This is a translation to French, from 1831."
-        short_desc = "French language, 1831."
-        exam = "Au commencement Dieu créa le ciel et la terre;"
-    else:
+    info = version_code2info.get(code)
+    if (not info) or ("short_desc" not in info):
         raise ValueError(f"Unrecognized version code: {code}")
-    desc = short_desc if use_short_desc else full_desc
-    return (version_name, desc, exam)
+    desc = info["short_desc"] if use_short_desc else info["full_desc"]
+    return (info["name"], desc, info["example"])
 
 def sefaria_url(book_code, version_code):
     book_web = book_code2web[book_code]
@@ -121,11 +58,89 @@ def sefaria_local(book_code, version_code):
 #    cur_dir = os.path.dirname(os.path.abspath(__file__))
 #    sefaria_folder =  os.path.join(cur_dir, 'data', 'sefaria')
     sefaria_folder = os.environ["SEFARIA_DATA_DIR"]
-    filename = f"{book_code}.{version_code}.json"
+    filename = sefaria_filename(book_code, version_code)
     filepath = os.path.join(sefaria_folder, filename)
     return filepath
 
+def sefaria_filename(book_code, version_code):
+    return f"{book_code}.{version_code}.json"
+
+# The manifest (SEFARIA_DATA_DIR/manifest.json) records which (book, version) pairs were downloaded, with their verse counts per chapter,
+# so finding what exists locally doesn't require checking (or opening) a file for every pair in the catalog.
+MANIFEST_FILENAME = "manifest.json"
+_manifest = None
+_manifest_synced = False # Whether the manifest was already compared with the data folder in this process
+
+def sefaria_manifest(refresh=False) -> dict:
+    """
+    The manifest of the local corpus, loaded once per process.
+    On the first call (and after a download) the data folder is listed once and every book file is stat-ed (nothing is opened):
+    only files that are new or changed (by modification time) since the manifest was written are re-read, and files that disappeared are dropped.
+    With refresh=True, all the files are re-read.
+
+    Returns:
+    - dictionary {"files": {filename: {"book", "version", "mtime", "verse_counts" (list of the number of verses in every chapter)}}}
+    """
+    global _manifest, _manifest_synced
+    if _manifest_synced and not refresh:
+        return _manifest
+    sefaria_folder = os.environ["SEFARIA_DATA_DIR"]
+    manifest_file = os.path.join(sefaria_folder, MANIFEST_FILENAME)
+    if _manifest is None:
+        _manifest = {"files": {}}
+        if os.path.exists(manifest_file):
+            try:
+                with open(manifest_file, 'r', encoding='utf-8') as f:
+                    _manifest = json.load(f)
+            except json.JSONDecodeError:
+                print(f"!!! Ignoring a corrupt {manifest_file} (rebuilding it)") # The sync below re-reads all the files
+    filename2pair = {sefaria_filename(book, version): (book, version) for book in book_code2web for version in version_code2web}
+    present = {filename for filename in os.listdir(sefaria_folder) if filename in filename2pair}
+    files = _manifest["files"]
+    changed = False
+    for filename in set(files) - present:
+        del files[filename]
+        changed = True
+    for filename in sorted(present):
+        local = os.path.join(sefaria_folder, filename)
+        mtime = os.path.getmtime(local)
+        if (not refresh) and (filename in files) and (files[filename]["mtime"] == mtime):
+            continue
+        with open(local, 'r', encoding='utf-8') as f:
+            book_data = json.load(f)
+        (book, version) = filename2pair[filename]
+        files[filename] = {"book": book, "version": version, "mtime": mtime, "verse_counts": [len(chapter) for chapter in book_data['text']]}
+        changed = True
+    if changed:
+        try:
+            # Write to a temporary file and then rename it, so a crash (or another process writing at the same time) never leaves a truncated manifest:
+            tmp_file = f"{manifest_file}.{os.getpid()}.tmp"
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(_manifest, f, separators=(',', ':'))
+            os.replace(tmp_file, manifest_file)
+        except OSError as ex:
+            print(f"!!! Failed writing {manifest_file}: {ex}")
+    _manifest_synced = True
+    return _manifest
+
+def sefaria_available(books=None, versions=None) -> list[tuple[str, str]]:
+    """
+    The (book, version) pairs that exist locally (according to the manifest), optionally only some books/versions, in catalog order.
+    """
+    pairs = {(entry["book"], entry["version"]) for entry in sefaria_manifest()["files"].values()}
+    books = books or list(book_code2web.keys())
+    versions = versions or list(version_code2web.keys())
+    return [(book, version) for book in books for version in versions if (book, version) in pairs]
+
+def sefaria_verse_counts(book_code, version_code) -> list[int]:
+    """
+    The number of verses in every chapter of a book (in a specific version), without opening the book. None if it doesn't exist locally.
+    """
+    entry = sefaria_manifest()["files"].get(sefaria_filename(book_code, version_code))
+    return entry["verse_counts"] if entry else None
+
 def download_json_file(url, local_file, skip_fail=False) -> bool:
+    import requests
     try:
         response = requests.get(url)
         response.raise_for_status()  # raises error if download failed
@@ -139,6 +154,10 @@ def download_json_file(url, local_file, skip_fail=False) -> bool:
     with open(local_file, "w", encoding="utf-8") as f:
         json.dump(data, f, ensure_ascii=False, indent=2)
     print(f"++ {local_file}")
+    global _manifest_synced
+    _manifest_synced = False # The next read of the manifest picks up the new file
+    if _manifest is not None:
+        _manifest["files"].pop(os.path.basename(local_file), None)
     return True
 
 def sefaria_json2verses(book_data):
@@ -155,27 +174,26 @@ def sefaria_json2text(book_data, separate_chapters=False):
     return whole_book
 
 def sefaria_read_content(only_book=None, only_version=None, only_torah=True):
-    books = [only_book] if only_book else list(book_code2web.keys())
-    if (not only_book) and only_torah:
-        books = [BookCode.GENESIS, BookCode.EXODUS, BookCode.LEVITICUS, BookCode.NUMBERS, BookCode.DEUTERONOMY]
-    versions = [only_version] if only_version else list(version_code2web.keys())
+    books = [only_book] if only_book else (books_in_section("torah") if only_torah else None)
+    versions = [only_version] if only_version else None
+    pairs = sefaria_available(books, versions) # Only the requested books/versions that exist locally are opened
+    if only_book and only_version and not pairs:
+        print(f"-- Missing {sefaria_local(only_book, only_version)}")
     verses = []
-    for book in books:
-        for version in versions:
-            local = sefaria_local(book, version)
-            if not os.path.exists(local):
-                print(f"-- Missing {local}")
-                continue
-            with open(local, 'r', encoding='utf-8') as f:
-                book_data = json.load(f)
-            book_verses = sefaria_json2verses(book_data)
-            verses.extend(book_verses)
-            print(f"++ {len(book_verses)} from {book} ({version})")
+    for (book, version) in pairs:
+        with open(sefaria_local(book, version), 'r', encoding='utf-8') as f:
+            book_data = json.load(f)
+        book_verses = sefaria_json2verses(book_data)
+        verses.extend(book_verses)
+        print(f"++ {len(book_verses)} from {book} ({version})")
     
 #    print(f"Read total {len(verses)} verses.")
     return verses
 
 def clean_html_with_bs4(raw_html):
+    if ('<' not in raw_html) and ('&' not in raw_html):
+        return raw_html.strip() # Nothing to parse (this is what BeautifulSoup would return), so don't pay for it
+    from bs4 import BeautifulSoup
     soup = BeautifulSoup(raw_html, "html.parser") # Parse the HTML content
     clean_text = soup.get_text(strip=True) # Extract all text, stripping extra whitespace
     return clean_text
@@ -201,7 +219,8 @@ def sefaria_read_verses_and_metadata(book, version, strip_html=True) -> list[dic
                 })
     return verses
 
-def sefaria_read_multiversions_of_book(book, versions, col_per_version=False, strip_html=True) -> pd.DataFrame:
+def sefaria_read_multiversions_of_book(book, versions, col_per_version=False, strip_html=True) -> "pd.DataFrame":
+    import pandas as pd
     verses = []
     for version in versions:
         verses_i = sefaria_read_verses_and_metadata(book, version, strip_html=strip_html)